@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db, replicas
+        connection_created.connect(
+            db.configure_connection, dispatch_uid='core.db.configure'
+        )
+        post_save.connect(
+            replicas.mark_written, dispatch_uid='core.replicas.saved'
+        )
+        post_delete.connect(
+            replicas.mark_written, dispatch_uid='core.replicas.deleted'
+        )
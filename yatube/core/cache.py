@@ -0,0 +1,303 @@
+"""Общий кеш для нескольких процессов.
+
+SQLiteCache хранит записи в файле SQLite, который видят все воркеры на
+машине. TieredCache ставит перед ним короткоживущий кеш в памяти
+процесса: чужие изменения видны с задержкой не больше LOCAL_TIMEOUT,
+поэтому изменяемые данные кладутся под версионированными ключами.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+_MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite, общий для всех процессов."""
+
+    # Раз в столько записей удаляем просроченное и лишнее.
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        if getattr(self._local, "pid", None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            "SELECT value, expires FROM cache WHERE key = ?",
+            (self._key(key, version),),
+        ).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        rows = self._connection().execute(
+            "SELECT key, value, expires FROM cache WHERE key IN ({})".format(
+                ", ".join("?" * len(made))
+            ),
+            list(made),
+        )
+        return {
+            made[key]: pickle.loads(value)
+            for key, value, expires in rows
+            if self._alive(expires)
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self._connection().executemany(
+            "INSERT OR REPLACE INTO cache (key, value, expires) "
+            "VALUES (?, ?, ?)",
+            [
+                (self._key(key, version), pickle.dumps(value), expires)
+                for key, value in data.items()
+            ],
+        )
+        self._maybe_cull(len(data))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM cache WHERE key = ? AND expires <= ?",
+                (key, time.time()),
+            )
+            added = connection.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), self.get_backend_timeout(timeout)),
+            ).rowcount == 1
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно прибавляет delta: чтение и запись идут в одной
+        транзакции с блокировкой на запись, срок записи не меняется."""
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                "UPDATE cache SET value = ? WHERE key = ?",
+                (pickle.dumps(value), key),
+            )
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._connection().execute(
+            "UPDATE cache SET expires = ? WHERE key = ?",
+            (self.get_backend_timeout(timeout), self._key(key, version)),
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        self._connection().executemany(
+            "DELETE FROM cache WHERE key = ?",
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version) is not _MISSING
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def _maybe_cull(self, writes):
+        self._writes += writes
+        if self._writes < self.cull_every:
+            return
+        self._writes = 0
+        connection = self._connection()
+        connection.execute(
+            "DELETE FROM cache WHERE expires <= ?", (time.time(),)
+        )
+        (count,) = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self._max_entries:
+            # Бессрочные записи — метки версий (posts.cards, page_cache):
+            # их потеря вернула бы к жизни старые версии ключей, поэтому
+            # вытесняем только записи со сроком, ближайшие к истечению.
+            connection.execute(
+                "DELETE FROM cache WHERE rowid IN "
+                "(SELECT rowid FROM cache WHERE expires IS NOT NULL "
+                "ORDER BY expires LIMIT ?)",
+                (count // self._cull_frequency,),
+            )
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кеш: память процесса (L1) перед общим кешем (L2).
+
+    OPTIONS: SHARED — алиас общего кеша в CACHES, LOCAL_TIMEOUT — сколько
+    секунд запись живёт в L1, LOCAL_MAX_ENTRIES — размер L1.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED", "shared")
+        self._local_timeout = options.get("LOCAL_TIMEOUT", 5)
+        self._l1 = LocMemCache(
+            location or f"tiered-{self._shared_alias}",
+            {"OPTIONS": {
+                "MAX_ENTRIES": options.get("LOCAL_MAX_ENTRIES", 1000),
+            }},
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_ttl(self, timeout):
+        if timeout == DEFAULT_TIMEOUT or timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def get(self, key, default=None, version=None):
+        value = self._l1.get(key, _MISSING, version)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        self._l1.set(key, value, self._local_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = self._l1.get_many(keys, version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing, version)
+            self._l1.set_many(shared, self._local_timeout, version)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._l1.set(key, value, self._local_ttl(timeout), version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        self._l1.set_many(data, self._local_ttl(timeout), version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Атомарность обеспечивает общий кеш, L1 только запоминает итог.
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._l1.set(key, value, self._local_ttl(timeout), version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._l1.delete(key, version)
+        self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        self._l1.delete_many(keys, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        self._l1.delete(key, version)
+        return self.shared.incr(key, delta, version)
+
+    def clear(self):
+        self._l1.clear()
+        self.shared.clear()
+
+
+def get_or_set_once(key, compute, timeout=DEFAULT_TIMEOUT, cache=None,
+                    lock_timeout=10, poll=0.05):
+    """cache.get_or_set с защитой от «стада»: при промахе значение
+    вычисляет один процесс, остальные ждут его результат."""
+    if cache is None:
+        cache = caches["default"]
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    lock = f"{key}:lock"
+    if cache.add(lock, 1, lock_timeout):
+        try:
+            # Пока мы брали блокировку, значение мог положить другой.
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = compute()
+                cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock)
+        return value
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    # Вычисляющий процесс не успел: считаем сами, чтобы не зависнуть.
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,74 @@
+"""Настройка SQLite под рабочую нагрузку.
+
+Каждое новое соединение получает прагмы из PRAGMAS (их можно
+переопределить настройкой SQLITE_PRAGMAS): журнал WAL, чтобы запись не
+блокировала чтение, ослабленный synchronous, больший кеш страниц, mmap
+и ожидание блокировки вместо немедленной ошибки. Запись, которая всё же
+упёрлась в блокировку, повторяет retry_on_locked.
+"""
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    # В режиме WAL NORMAL не портит базу при сбое, теряется лишь
+    # последняя транзакция при отключении питания.
+    "synchronous": "NORMAL",
+    # Отрицательное значение — в КиБ: 64 МБ на соединение.
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+
+LOCKED_RETRIES: int = 5
+LOCKED_DELAY: float = 0.05
+
+
+def pragmas():
+    return {**PRAGMAS, **getattr(settings, "SQLITE_PRAGMAS", {})}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: выставляет прагмы соединению."""
+    if connection.vendor != "sqlite":
+        return
+    for name, value in pragmas().items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def is_locked(error):
+    return "locked" in str(error)
+
+
+def retry_on_locked(using=None, retries=LOCKED_RETRIES, delay=LOCKED_DELAY):
+    """Повторяет запись, получившую «database is locked», с растущей
+    паузой. Внутри чужой транзакции не повторяет: откатится уже она, и
+    повторять нужно её целиком."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            connection = transaction.get_connection(using)
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as error:
+                    if (
+                        not is_locked(error)
+                        or attempt >= retries
+                        or connection.in_atomic_block
+                    ):
+                        raise
+                    logger.warning("База занята, повтор %s", attempt + 1)
+                    time.sleep(delay * 2 ** attempt * random.uniform(1, 2))
+                    attempt += 1
+        return wrapper
+    return decorator
@@ -0,0 +1,173 @@
+"""Фоновые задачи в базе.
+
+Функция-задача регистрируется декоратором task под именем и ставится в
+очередь через enqueue (или func.delay): в таблицу core.Job пишется
+строка с аргументами в JSON — в той же транзакции, что и изменение,
+которое её породило. Команда run_jobs забирает готовые задачи пачками,
+помечая их своим именем на LEASE_SECONDS, выполняет и удаляет. Упавшая
+задача повторяется с растущей паузой, после retries попыток остаётся в
+таблице с failed=True и текстом ошибки.
+
+Задачи с batch=True получают список аргументов всех задач этого имени
+из пачки и обрабатывают их разом; если пачка упала, её задачи
+выполняются по одной, и повторяются только упавшие.
+
+При JOBS_ALWAYS_EAGER задачи выполняются сразу в enqueue — так работают
+разработка и тесты, где воркер не запущен.
+"""
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRIES: int = 5
+RETRY_DELAY: int = 10
+LEASE_SECONDS: int = 300
+
+_registry = {}
+
+
+class Task:
+    def __init__(self, name, func, batch, retries):
+        self.name = name
+        self.func = func
+        self.batch = batch
+        self.retries = retries
+
+    def __call__(self, payloads):
+        if self.batch:
+            self.func(payloads)
+        else:
+            for payload in payloads:
+                self.func(**payload)
+
+
+def task(name, batch=False, retries=RETRIES):
+    """Регистрирует функцию как задачу name и добавляет ей func.delay."""
+    def decorator(func):
+        if name in _registry:
+            raise ValueError(f"Задача {name} уже зарегистрирована")
+        _registry[name] = Task(name, func, batch, retries)
+
+        def delay(key="", **payload):
+            return enqueue(name, key=key, **payload)
+
+        func.delay = delay
+        return func
+    return decorator
+
+
+def eager():
+    return getattr(settings, "JOBS_ALWAYS_EAGER", True)
+
+
+def enqueue(name, key="", **payload):
+    """Ставит задачу в очередь; при JOBS_ALWAYS_EAGER выполняет сразу.
+    Задача с ключом key не добавляется, если такая уже ждёт: это
+    гарантирует уникальное ограничение job_waiting_key."""
+    task = _registry[name]
+    if eager():
+        task([payload])
+        return None
+    job = Job(name=name, key=key, payload=json.dumps(payload))
+    if not key:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач: помечает их воркером и сроком
+    аренды. Задачи упавшего воркера вернутся в очередь по её окончании."""
+    now = timezone.now()
+    due = Job.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        failed=False,
+        run_at__lte=now,
+    )
+    with transaction.atomic():
+        ids = list(
+            due.order_by("run_at", "pk").values_list("pk", flat=True)[:limit]
+        )
+        due.filter(pk__in=ids).update(
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=LEASE_SECONDS),
+        )
+    return list(
+        Job.objects.filter(pk__in=ids, locked_by=worker)
+        .order_by("run_at", "pk")
+    )
+
+
+def run_pending(worker=None, limit=100):
+    """Выполняет одну пачку задач и возвращает их число."""
+    jobs = claim(worker or worker_name(), limit)
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.name, []).append(job)
+    for name, group in groups.items():
+        task = _registry.get(name)
+        if task is None:
+            _failed(group, f"Неизвестная задача {name}", final=True)
+        elif task.batch:
+            _run(task, group)
+        else:
+            for job in group:
+                _run(task, [job])
+    return len(jobs)
+
+
+def _run(task, jobs):
+    try:
+        with transaction.atomic():
+            task([json.loads(job.payload) for job in jobs])
+    except Exception as error:
+        if len(jobs) > 1:
+            # Пачка откатилась целиком: выполняем задачи по одной, чтобы
+            # повторялись только те, что падают сами.
+            for job in jobs:
+                _run(task, [job])
+            return
+        logger.exception("Задача %s не выполнена", task.name)
+        _failed(jobs, repr(error), final=False, retries=task.retries)
+    else:
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+
+
+def _failed(jobs, error, final, retries=RETRIES):
+    now = timezone.now()
+    for job in jobs:
+        job.attempts += 1
+        job.last_error = error
+        job.locked_by = ""
+        job.locked_until = None
+        if final or job.attempts >= retries:
+            job.failed = True
+        else:
+            job.run_at = now + timedelta(
+                seconds=RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        job.save(update_fields=[
+            "attempts", "last_error", "locked_by", "locked_until",
+            "failed", "run_at",
+        ])
@@ -0,0 +1,51 @@
+"""Нагрузочный прогон по HTTP.
+
+Шлёт запросы на адрес с разной степенью параллельности и сводит
+пропускную способность и задержки. Меряет любой запущенный сервер:
+``runserver``, gunicorn или ASGI-сервер с yatube.asgi, поэтому выигрыш
+от параллельной обработки виден сравнением прогонов.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from core import profiling
+
+TIMEOUT: int = 30
+
+
+def fetch(url, headers):
+    """Один запрос: (статус или None при сбое, секунды)."""
+    start = time.perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers), timeout=TIMEOUT) as reply:
+            reply.read()
+            status = reply.status
+    except HTTPError as error:
+        status = error.code
+    except (URLError, OSError):
+        status = None
+    return status, time.perf_counter() - start
+
+
+def run(url, concurrency, requests, headers=None):
+    """Прогон requests запросов в concurrency потоков."""
+    headers = headers or {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(
+            pool.map(lambda _: fetch(url, headers), range(requests))
+        )
+        elapsed = time.perf_counter() - start
+    latencies = [seconds * 1000 for _, seconds in results]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(
+            1 for status, _ in results if status is None or status >= 500
+        ),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(profiling.percentile(latencies, 0.5), 2),
+        "p95_ms": round(profiling.percentile(latencies, 0.95), 2),
+    }
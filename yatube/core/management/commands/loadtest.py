@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает запущенный сервер запросами с разной параллельностью "
+        "и печатает пропускную способность и задержки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "urls", nargs="+",
+            help="Полные адреса, например http://127.0.0.1:8000/.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, nargs="+", default=[1, 8, 32],
+            help="Степени параллельности, по прогону на каждую.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200,
+            help="Запросов в каждом прогоне.",
+        )
+        parser.add_argument(
+            "--cookie", help="Заголовок Cookie, например sessionid=...",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Вывести итоги в JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or min(options["concurrency"]) < 1:
+            raise CommandError("Число запросов и потоков должно быть > 0.")
+        headers = {"Cookie": options["cookie"]} if options["cookie"] else {}
+        rows = []
+        for url in options["urls"]:
+            for concurrency in options["concurrency"]:
+                row = loadtest.run(
+                    url, concurrency, options["requests"], headers
+                )
+                rows.append({"url": url, **row})
+                if not options["json"]:
+                    self.stdout.write(
+                        f"{url} x{concurrency}: {row['rps']} запр/с, "
+                        f"p50 {row['p50_ms']} мс, p95 {row['p95_ms']} мс, "
+                        f"ошибок {row['errors']}"
+                    )
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
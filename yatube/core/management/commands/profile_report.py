@@ -0,0 +1,47 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = "Сводит записи профилировщика в отчёт о горячих view."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--log", default=settings.PROFILING_LOG,
+            help="Лог профилировщика; ротированные копии читаются тоже.",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Сколько view показать.",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Вывести отчёт в JSON.",
+        )
+
+    def handle(self, *args, **options):
+        rows = profiling.report(profiling.read_records(options["log"]))
+        rows = rows[:options["limit"]]
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            return
+        if not rows:
+            self.stdout.write("Записей профилировщика нет.")
+            return
+        for row in rows:
+            self.stdout.write(
+                f"{row['view']}: {row['requests']} запр., "
+                f"{row['share']:.1%} времени, среднее {row['avg_ms']} мс, "
+                f"p95 {row['p95_ms']} мс"
+            )
+            self.stdout.write(
+                f"  SQL: {row['avg_sql_count']} запр. за "
+                f"{row['avg_sql_ms']} мс, повторов {row['avg_duplicates']}, "
+                f"похожих {row['avg_similar']}"
+            )
+            for name, ms in row["templates_ms"].items():
+                self.stdout.write(f"  шаблон {name}: {ms} мс")
+            for name, ms in row["sections_ms"].items():
+                self.stdout.write(f"  {name}: {ms} мс")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет фоновые задачи из очереди core.Job: пачками, "
+        "пока не будет остановлен, или один раз с --once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=100,
+            help="Сколько задач забирать за раз.",
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=1,
+            help="Пауза в секундах, когда очередь пуста.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Выполнить готовые задачи и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                done = jobs.run_pending(worker, options["batch_size"])
+                total += done
+                if done:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Выполнено задач: {total}.")
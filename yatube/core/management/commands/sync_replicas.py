@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в файлы реплик из "
+        "DATABASE_REPLICAS: однократно или с заданным интервалом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Повторять каждые N секунд; 0 — скопировать один раз.",
+        )
+
+    def handle(self, *args, **options):
+        if not replicas.replicas():
+            raise CommandError(
+                "Реплики не настроены: задайте DB_REPLICAS в окружении."
+            )
+        while True:
+            started = time.monotonic()
+            replicas.sync()
+            self.stdout.write(
+                f"Реплики обновлены за {time.monotonic() - started:.2f} с."
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
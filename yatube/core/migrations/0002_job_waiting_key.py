@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:34
+
+from django.db import migrations, models
+
+
+def drop_duplicates(apps, schema_editor):
+    """Из ждущих задач с одинаковым ключом оставляет самую раннюю."""
+    Job = apps.get_model('core', 'Job')
+    seen = set()
+    duplicates = []
+    waiting = Job.objects.filter(failed=False).exclude(key='')
+    for pk, name, key in waiting.order_by('pk').values_list(
+        'pk', 'name', 'key'
+    ):
+        if (name, key) in seen:
+            duplicates.append(pk)
+        seen.add((name, key))
+    Job.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('failed', False), models.Q(_negated=True, key='')), fields=('name', 'key'), name='job_waiting_key'),
+        ),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from .db import retry_on_locked
 
 
 class CreatedModel(models.Model):
@@ -14,3 +17,49 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class AtomicSaveMixin:
+    """Сохраняет запись и выполняет обработчики post_save
+    в одной транзакции; при занятой базе транзакция повторяется."""
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using')
+
+        @retry_on_locked(using)
+        def atomic_save():
+            with transaction.atomic(using=using):
+                super(AtomicSaveMixin, self).save(*args, **kwargs)
+
+        atomic_save()
+
+
+class Job(models.Model):
+    """Фоновая задача из core.jobs. Выполненные задачи удаляются."""
+    name = models.CharField(max_length=100)
+    payload = models.TextField(default='{}')
+    # Задачи с одинаковым непустым ключом не дублируются в очереди.
+    key = models.CharField(max_length=255, blank=True, db_index=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['failed', 'run_at'], name='job_due'),
+        ]
+        constraints = [
+            # Ждущая задача с ключом — одна на имя (см. core.jobs.enqueue).
+            models.UniqueConstraint(
+                fields=['name', 'key'],
+                condition=models.Q(failed=False) & ~models.Q(key=''),
+                name='job_waiting_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
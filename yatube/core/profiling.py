@@ -0,0 +1,322 @@
+"""Выборочное профилирование запросов.
+
+ProfilingMiddleware для доли PROFILING_SAMPLE_RATE запросов записывает
+число и время SQL-запросов, повторы, время рендера каждого шаблона (вместе
+с вложенными include) и отмеченных section() участков, а также общее
+время обработки. Записи — по строке JSON — уходят в ротируемый лог
+PROFILING_LOG; команда profile_report сводит их в отчёт по view.
+capture() снимает те же замеры с произвольного участка кода, например
+в нагрузочном прогоне posts.benchmark.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+
+# Сколько самых частых повторов запроса сохранять в записи.
+TOP_DUPLICATES: int = 3
+
+
+class Profile:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.queries = []
+        # Строки, прочитанные из курсоров.
+        self.rows = 0
+        self.templates = defaultdict(float)
+        # Время рендера шаблонов верхнего уровня, без двойного счёта
+        # вложенных include.
+        self.render = 0.0
+        self.sections = defaultdict(float)
+        self._depth = 0
+
+    def record_query(self, sql, params, duration):
+        self.queries.append((sql, repr(params), duration))
+
+    def summary(self):
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        similar = Counter(sql for sql, _, _ in self.queries)
+        duplicates = sorted(
+            ((count, sql) for (sql, _), count in exact.items() if count > 1),
+            reverse=True,
+        )
+        return {
+            "sql_count": len(self.queries),
+            "sql_ms": round(sum(d for _, _, d in self.queries) * 1000, 3),
+            "sql_rows": self.rows,
+            # Тот же запрос с теми же параметрами.
+            "sql_duplicates": sum(count - 1 for count, _ in duplicates),
+            # Тот же запрос с другими параметрами — признак N+1.
+            "sql_similar": sum(c - 1 for c in similar.values() if c > 1),
+            "top_duplicates": [
+                {"count": count, "sql": sql}
+                for count, sql in duplicates[:TOP_DUPLICATES]
+            ],
+            "templates_ms": {
+                name: round(seconds * 1000, 3)
+                for name, seconds in self.templates.items()
+            },
+            "sections_ms": {
+                name: round(seconds * 1000, 3)
+                for name, seconds in self.sections.items()
+            },
+        }
+
+
+def current():
+    """Профиль текущего запроса или None, если запрос не в выборке."""
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def section(name):
+    """Отмечает участок кода, время которого попадёт в профиль."""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[name] += time.perf_counter() - start
+
+
+class _RowCounter:
+    """Курсор базы, считающий выбранные из него строки в профиль."""
+
+    def __init__(self, cursor, profile):
+        self.cursor = cursor
+        self.profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.profile.rows += 1
+            yield row
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        self.profile.rows += row is not None
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.profile.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.profile.rows += len(rows)
+        return rows
+
+
+def _query_timer(execute, sql, params, many, context):
+    profile = current()
+    if profile is None:
+        return execute(sql, params, many, context)
+    wrapper = context["cursor"]
+    if not isinstance(wrapper.cursor, _RowCounter):
+        wrapper.cursor = _RowCounter(wrapper.cursor, profile)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, params, time.perf_counter() - start)
+
+
+def _install_template_timer():
+    """Оборачивает Template._render один раз на процесс: так замеряются
+    и страницы, и каждый include, а вне выборки обёртка почти бесплатна."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        original = Template._render
+
+        def _render(template, context):
+            profile = current()
+            if profile is None:
+                return original(template, context)
+            profile._depth += 1
+            start = time.perf_counter()
+            try:
+                return original(template, context)
+            finally:
+                elapsed = time.perf_counter() - start
+                profile._depth -= 1
+                if not profile._depth:
+                    profile.render += elapsed
+                name = template.origin.template_name or template.origin.name
+                profile.templates[str(name)] += elapsed
+
+        Template._render = _render
+        _installed = True
+
+
+def get_sink():
+    """Логгер с ротацией файла PROFILING_LOG."""
+    sink = logging.getLogger("yatube.profiling")
+    path = Path(settings.PROFILING_LOG).resolve()
+    if sink.handlers and sink.handlers[0].baseFilename == str(path):
+        return sink
+    for handler in sink.handlers[:]:
+        sink.removeHandler(handler)
+        handler.close()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=getattr(settings, "PROFILING_LOG_MAX_BYTES", 10 << 20),
+        backupCount=getattr(settings, "PROFILING_LOG_BACKUPS", 5),
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    sink.addHandler(handler)
+    sink.setLevel(logging.INFO)
+    sink.propagate = False
+    return sink
+
+
+@contextmanager
+def capture():
+    """Профилирует код внутри блока в текущем потоке и отдаёт Profile."""
+    _install_template_timer()
+    profile = _local.profile = Profile()
+    try:
+        with _wrap_connections():
+            yield profile
+    finally:
+        _local.profile = None
+
+
+class ProfilingMiddleware:
+    """Профилирует долю запросов; при нулевой доле отключается целиком."""
+
+    def __init__(self, get_response):
+        self.rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+        if not self.rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _install_template_timer()
+
+    def __call__(self, request):
+        # Запрос внутри capture() уже профилируется снаружи.
+        if current() is not None or random.random() >= self.rate:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with capture() as profile:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        record = {
+            "ts": round(time.time(), 3),
+            "view": match.view_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 3),
+            **profile.summary(),
+        }
+        try:
+            get_sink().info(json.dumps(record, ensure_ascii=False))
+        except OSError:
+            logger.exception("Не удалось записать профиль запроса")
+        return response
+
+
+@contextmanager
+def _wrap_connections():
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(_query_timer))
+        yield
+
+
+def percentile(values, share):
+    """Значение, ниже которого лежит доля share замеров (0.95 — p95)."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def read_records(path):
+    """Записи из лога и его ротированных копий, от старых к новым."""
+    path = Path(path)
+    files = sorted(
+        (p for p in path.parent.glob(path.name + ".*")
+         if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True,
+    )
+    for file in [*files, path]:
+        if not file.exists():
+            continue
+        with open(file, encoding="utf-8") as lines:
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def report(records, top_templates=3):
+    """Сводка по view, от самых затратных по суммарному времени."""
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record.get("view") or "-"].append(record)
+    grand_total = sum(
+        r["total_ms"] for group in by_view.values() for r in group
+    ) or 1
+    rows = []
+    for view, group in by_view.items():
+        count = len(group)
+        totals = [r["total_ms"] for r in group]
+        templates = Counter()
+        sections = Counter()
+        for r in group:
+            templates.update(r.get("templates_ms", {}))
+            sections.update(r.get("sections_ms", {}))
+        rows.append({
+            "view": view,
+            "requests": count,
+            "share": round(sum(totals) / grand_total, 4),
+            "avg_ms": round(sum(totals) / count, 3),
+            "p95_ms": percentile(totals, 0.95),
+            "avg_sql_count": round(
+                sum(r["sql_count"] for r in group) / count, 2
+            ),
+            "avg_sql_ms": round(sum(r["sql_ms"] for r in group) / count, 3),
+            "avg_duplicates": round(
+                sum(r["sql_duplicates"] for r in group) / count, 2
+            ),
+            "avg_similar": round(
+                sum(r["sql_similar"] for r in group) / count, 2
+            ),
+            "templates_ms": {
+                name: round(total / count, 3)
+                for name, total in templates.most_common(top_templates)
+            },
+            "sections_ms": {
+                name: round(total / count, 3)
+                for name, total in sections.most_common()
+            },
+        })
+    return sorted(rows, key=lambda row: row["share"], reverse=True)
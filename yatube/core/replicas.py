@@ -0,0 +1,139 @@
+"""Чтение с реплик базы.
+
+ReplicaRouter отправляет чтение внутри запроса на одну из реплик
+DATABASE_REPLICAS (одну на весь запрос), а запись — на основную базу.
+ReplicaMiddleware включает реплики только для безопасных запросов и
+после записи модели (сигналы post_save и post_delete, см. mark_written)
+ставит клиенту cookie, которая на REPLICA_STICKY_SECONDS прикрепляет
+его чтение к основной базе: автор сразу видит свой пост или
+комментарий, даже если реплика отстаёт.
+Команды и фоновые потоки всегда работают с основной базой.
+
+Для локальной проверки реплики — копии файла SQLite, которые обновляет
+sync() (команда sync_replicas). Время каждой копии хранится в кеше:
+по нему lagging() определяет, что реплика ещё не видела изменение, и
+собранное по ней нельзя класть в кеш под новой версией.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+STICKY_COOKIE = "use_primary"
+SYNCED_KEY = "replica_synced:{}"
+# Записи, которые клиенту не нужно сразу читать обратно: сессия и
+# служебная очередь задач.
+UNTRACKED_MODELS = frozenset({"sessions.session", "core.job"})
+
+_local = threading.local()
+
+
+def replicas():
+    """Реплики, отличные от основной базы. В тестах реплики — зеркала
+    (TEST MIRROR) и указывают на основную базу, поэтому не участвуют."""
+    primary = connections[PRIMARY].settings_dict["NAME"]
+    return [
+        alias for alias in getattr(settings, "DATABASE_REPLICAS", ())
+        if connections[alias].settings_dict["NAME"] != primary
+    ]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_local, "replica", None) or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Сюда приходят и get_or_create, и сохранение сессии: запись
+        # отмечает mark_written, когда модель действительно изменена.
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {PRIMARY, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит на реплики вместе с данными.
+        if db in replicas():
+            return False
+        return None
+
+
+def lagging(changed_at):
+    """Читает ли текущий запрос реплику, скопированную раньше changed_at
+    (время Unix). Тогда данные изменения в ней может не быть."""
+    alias = getattr(_local, "replica", None)
+    if alias is None:
+        return False
+    synced = cache.get(SYNCED_KEY.format(alias))
+    return synced is None or synced < changed_at
+
+
+def mark_written(sender, **kwargs):
+    """Обработчик post_save и post_delete: запрос изменил данные."""
+    if sender._meta.label_lower not in UNTRACKED_MODELS:
+        _local.wrote = True
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in ("GET", "HEAD", "OPTIONS")
+            or STICKY_COOKIE in request.COOKIES
+        )
+        pool = replicas()
+        _local.replica = random.choice(pool) if pool and not pinned else None
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _local.wrote
+            _local.replica = None
+            _local.wrote = False
+        if wrote and pool:
+            response.set_cookie(
+                STICKY_COOKIE, "1",
+                max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 10),
+                httponly=True,
+            )
+        return response
+
+
+def _backup(primary, target):
+    replica = sqlite3.connect(target)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+
+
+def copy(source, target):
+    """Копирует файл SQLite через backup API: читатели копии видят либо
+    старое её состояние, либо новое целиком."""
+    primary = sqlite3.connect(source)
+    try:
+        _backup(primary, target)
+    finally:
+        primary.close()
+
+
+def sync(aliases=None):
+    """Обновляет файлы реплик копией основной базы. Основная база
+    читается через соединение Django — так копируется и база в памяти
+    (тесты)."""
+    primary = connections[PRIMARY]
+    primary.ensure_connection()
+    for alias in aliases or replicas():
+        # Копия содержит всё, что зафиксировано до начала копирования.
+        started = time.time()
+        _backup(primary.connection, connections[alias].settings_dict["NAME"])
+        cache.set(SYNCED_KEY.format(alias), started, None)
@@ -0,0 +1,42 @@
+"""Окружение тестов: manage.py test (TestRunner) и pytest (tests/conftest.py).
+
+Тесты чистят кеш, поэтому им достаётся свой файл во временном каталоге,
+а рабочий cache/cache.sqlite3 они не трогают. Поток пула миниатюр мог бы
+писать в MEDIA_ROOT теста, который тот уже удаляет: в тестах миниатюры
+создаются сразу после коммита.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def test_environment():
+    """Подменяет настройки на время тестов и убирает за собой кеш."""
+    directory = tempfile.mkdtemp(prefix="yatube-cache-")
+    caches = copy.deepcopy(settings.CACHES)
+    caches["shared"]["LOCATION"] = os.path.join(directory, "cache.sqlite3")
+    try:
+        with override_settings(CACHES=caches, THUMBNAIL_WORKERS=0):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner с настройками test_environment()."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._environment = ExitStack()
+        self._environment.enter_context(test_environment())
+
+    def teardown_test_environment(self, **kwargs):
+        self._environment.close()
+        super().teardown_test_environment(**kwargs)
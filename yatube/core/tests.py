@@ -0,0 +1,568 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import (IntegrityError, OperationalError, connection,
+                       transaction)
+from django.contrib.sessions.models import Session
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from core import db, jobs, loadtest, profiling, replicas
+from core.asgi import WsgiToAsgi
+from core.cache import SQLiteCache, get_or_set_once
+from core.models import Job
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 60},
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(TEMP_CACHE_DIR, 'cache.sqlite3'),
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class TieredCacheTest(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_values_reach_shared_tier(self):
+        """Запись видна в общем кеше, версии ключей различаются."""
+        self.cache.set('key', {'a': 1}, version=2)
+        self.assertEqual(caches['shared'].get('key', version=2), {'a': 1})
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(
+            self.cache.get_many(['key', 'other'], version=2), {'key': {'a': 1}}
+        )
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertFalse(self.cache.add('new', 2))
+        self.cache.delete('new')
+        self.assertIsNone(caches['shared'].get('new'))
+
+    def test_expired_values_are_missing(self):
+        """Просроченная запись в общем кеше считается отсутствующей."""
+        shared = caches['shared']
+        shared.set('key', 1, timeout=-1)
+        self.assertIsNone(shared.get('key'))
+        self.assertTrue(shared.add('key', 2))
+
+    def test_cull_keeps_permanent_keys(self):
+        """При переполнении вытесняются записи со сроком, начиная с
+        ближайших к истечению; бессрочные остаются."""
+        shared = SQLiteCache(
+            os.path.join(TEMP_CACHE_DIR, 'cull.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}},
+        )
+        shared.cull_every = 1
+        shared.clear()
+        shared.set('stamp', 1, timeout=None)
+        for n in range(6):
+            shared.set(f'key{n}', n, timeout=100 + n)
+        self.assertEqual(shared.get('stamp'), 1)
+        self.assertIsNone(shared.get('key0'))
+        self.assertEqual(shared.get('key5'), 5)
+
+    def test_incr_is_atomic(self):
+        """Одновременные incr из разных соединений не теряют сдвигов."""
+        self.cache.set('count', 0, timeout=100)
+
+        def work():
+            for _ in range(20):
+                self.cache.incr('count')
+
+        threads = [threading.Thread(target=work) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(caches['shared'].get('count'), 100)
+        self.assertEqual(self.cache.incr('count', -10), 90)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_single_flight(self):
+        """При одновременном промахе значение вычисляется один раз."""
+        calls = []
+        barrier = threading.Barrier(5)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        def worker():
+            barrier.wait()
+            results.append(get_or_set_once('hot', compute, cache=self.cache))
+
+        results = []
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+TEMP_LOG_DIR = tempfile.mkdtemp()
+PROFILING_LOG = os.path.join(TEMP_LOG_DIR, 'profile.log')
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_LOG=PROFILING_LOG)
+class ProfilingTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_requests_profiled_and_reported(self):
+        """Запрос попадает в лог, отчёт собирает его по имени view."""
+        user = User.objects.create_user(username='profiled')
+        Post.objects.create(text='Текст', author=user)
+        self.client.get(reverse('posts:index'))
+        [record] = profiling.read_records(PROFILING_LOG)
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['sql_count'], 0)
+        self.assertIn('posts/index.html', record['templates_ms'])
+        self.assertIn('posts/includes/post_card.html', record['templates_ms'])
+        self.assertIn('thumbnails', record['sections_ms'])
+
+        out = StringIO()
+        call_command('profile_report', '--json', stdout=out)
+        [row] = json.loads(out.getvalue())
+        self.assertEqual((row['view'], row['requests']), ('posts:index', 1))
+
+    def test_duplicate_queries_detected(self):
+        """Повторы и похожие запросы считаются отдельно."""
+        profile = profiling.Profile()
+        for params in ((1,), (1,), (2,)):
+            profile.record_query('SELECT %s', params, 0.001)
+        summary = profile.summary()
+        self.assertEqual(summary['sql_count'], 3)
+        self.assertEqual(summary['sql_duplicates'], 1)
+        self.assertEqual(summary['sql_similar'], 2)
+
+    def test_capture_counts_rows_and_render(self):
+        """capture() считает прочитанные строки и рендер страницы без
+        двойного счёта include; запрос внутри не пишется в лог."""
+        user = User.objects.create_user(username='captured')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=user) for i in range(3)
+        )
+        with profiling.capture() as profile:
+            list(Post.objects.all())
+            Post.objects.first()
+        self.assertEqual(profile.rows, 4)
+        self.assertEqual(len(profile.queries), 2)
+        logged = len(list(profiling.read_records(PROFILING_LOG)))
+        with profiling.capture() as profile:
+            self.client.get(reverse('posts:index'))
+        self.assertGreater(profile.render, 0)
+        self.assertLessEqual(
+            profile.render, sum(profile.templates.values())
+        )
+        self.assertEqual(
+            len(list(profiling.read_records(PROFILING_LOG))), logged
+        )
+
+
+def asgi_get(path, query=b""):
+    """Прогоняет GET через ASGI-приложение: (статус, заголовки, тело)."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query,
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+    return scope, receive, send, messages
+
+
+def sleepy_app(environ, start_response):
+    time.sleep(0.2)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"first ", b"second"]
+
+
+class AsgiTest(SimpleTestCase):
+    def test_django_page_served(self):
+        application = WsgiToAsgi(get_wsgi_application(), threads=2)
+        scope, receive, send, messages = asgi_get(reverse("about:author"))
+        asyncio.run(application(scope, receive, send))
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        self.assertIn("<html".encode(), body.lower())
+        self.assertFalse(messages[-1].get("more_body"))
+
+    def test_requests_handled_concurrently(self):
+        """Медленные запросы обрабатываются параллельно в пуле потоков."""
+        application = WsgiToAsgi(sleepy_app, threads=5)
+
+        async def five():
+            calls = [asgi_get("/") for _ in range(5)]
+            await asyncio.gather(*(
+                application(scope, receive, send)
+                for scope, receive, send, _ in calls
+            ))
+            return [messages for *_, messages in calls]
+
+        start = time.monotonic()
+        results = asyncio.run(five())
+        self.assertLess(time.monotonic() - start, 0.6)
+        for messages in results:
+            self.assertEqual(
+                b"".join(m.get("body", b"") for m in messages[1:]),
+                b"first second",
+            )
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class LoadTestTest(SimpleTestCase):
+    def test_run_reports_throughput(self):
+        server = make_server(
+            "127.0.0.1", 0, sleepy_app,
+            server_class=ThreadingWSGIServer, handler_class=QuietHandler,
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_port}/"
+        serial = loadtest.run(url, concurrency=1, requests=4)
+        parallel = loadtest.run(url, concurrency=4, requests=4)
+        self.assertEqual((serial["errors"], parallel["errors"]), (0, 0))
+        self.assertGreater(parallel["rps"], serial["rps"] * 2)
+
+
+class SQLiteTuningTest(TestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        """Файловая база открывается в WAL с настроенными прагмами."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            "NAME": os.path.join(directory, "db.sqlite3"),
+        })
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        raw = wrapper.connection
+        self.assertEqual(
+            raw.execute("PRAGMA journal_mode").fetchone()[0], "wal"
+        )
+        self.assertEqual(raw.execute("PRAGMA synchronous").fetchone()[0], 1)
+        self.assertEqual(
+            raw.execute("PRAGMA busy_timeout").fetchone()[0],
+            db.PRAGMAS["busy_timeout"],
+        )
+
+    def test_retry_on_locked(self):
+        """Занятая база — повтор, прочие ошибки и вложенные транзакции —
+        сразу наверх."""
+        calls = []
+
+        @db.retry_on_locked(delay=0)
+        def write(message):
+            calls.append(message)
+            if len(calls) < 3:
+                raise OperationalError(message)
+            return len(calls)
+
+        # TestCase сам держит транзакцию, поэтому её наличие задаём явно.
+        with mock.patch.object(connection, "in_atomic_block", False):
+            with self.assertLogs("core.db", "WARNING") as logs:
+                self.assertEqual(write("database is locked"), 3)
+            self.assertEqual(len(logs.output), 2)
+            calls.clear()
+            with self.assertRaises(OperationalError):
+                write("no such table")
+            self.assertEqual(len(calls), 1)
+        calls.clear()
+        with mock.patch.object(connection, "in_atomic_block", True):
+            with self.assertRaises(OperationalError):
+                write("database is locked")
+        self.assertEqual(len(calls), 1)
+
+
+class ReplicaTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            replicas, "replicas", return_value=["replica1"]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.middleware = replicas.ReplicaMiddleware(self.view)
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        self.read_from = router.db_for_read(Post)
+        # Выбор базы для записи ещё не запись (get_or_create, сессия).
+        router.db_for_write(Post)
+        replicas.mark_written(sender=Session)
+        if request.GET.get("write"):
+            replicas.mark_written(sender=Post)
+        return HttpResponse()
+
+    def test_reads_go_to_replica_until_write(self):
+        """Чтение идёт на реплику; после записи клиент прикреплён
+        к основной базе."""
+        response = self.middleware(self.factory.get("/"))
+        self.assertEqual(self.read_from, "replica1")
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+        response = self.middleware(self.factory.get("/", {"write": 1}))
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        # Запись вне запроса не прикрепляет следующий запрос.
+        replicas.mark_written(sender=Post)
+        response = self.middleware(self.factory.get("/"))
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get("/")
+        request.COOKIES[replicas.STICKY_COOKIE] = "1"
+        self.middleware(request)
+        self.assertEqual(self.read_from, "default")
+
+        self.middleware(self.factory.post("/"))
+        self.assertEqual(self.read_from, "default")
+        # Вне запроса (команды, фоновые потоки) — только основная база.
+        self.assertEqual(router.db_for_read(Post), "default")
+
+    def test_copy_keeps_files_in_sync(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = os.path.join(directory, "primary.sqlite3")
+        replica = os.path.join(directory, "replica.sqlite3")
+        with sqlite3.connect(primary) as source:
+            source.execute("CREATE TABLE posts (text TEXT)")
+            source.execute("INSERT INTO posts VALUES ('первый')")
+        replicas.copy(primary, replica)
+        with sqlite3.connect(primary) as source:
+            source.execute("INSERT INTO posts VALUES ('второй')")
+        target = sqlite3.connect(replica)
+        self.addCleanup(target.close)
+        self.assertEqual(
+            target.execute("SELECT count(*) FROM posts").fetchone()[0], 1
+        )
+        replicas.copy(primary, replica)
+        self.assertEqual(
+            target.execute("SELECT count(*) FROM posts").fetchone()[0], 2
+        )
+
+
+class ReplicaFileTest(TransactionTestCase):
+    """Реплика — отдельный файл, который обновляет sync(), а не зеркало
+    основной базы."""
+
+    alias = "replica_file"
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases[self.alias] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(directory, "replica.sqlite3"),
+        }
+        connections.ensure_defaults(self.alias)
+        connections.prepare_test_settings(self.alias)
+        self.addCleanup(self.drop_alias)
+        settings = self.settings(DATABASE_REPLICAS=[self.alias])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(username="writer")
+        Post.objects.create(text="Старый", author=self.author)
+        replicas.sync()
+
+    def tearDown(self):
+        cache.clear()
+
+    def drop_alias(self):
+        connections[self.alias].close()
+        del connections[self.alias]
+        del connections.databases[self.alias]
+
+    def texts(self, client):
+        response = client.get(reverse("posts:api_index"))
+        cache.clear()
+        return [post["text"] for post in response.json()["results"]]
+
+    def test_reads_from_synced_replica(self):
+        """Чтение идёт с реплики до sync(); автор после своей записи
+        читает основную базу."""
+        self.assertEqual(replicas.replicas(), [self.alias])
+        Post.objects.create(text="Новый", author=self.author)
+        self.assertEqual(self.texts(self.client), ["Старый"])
+
+        author = Client()
+        author.force_login(self.author)
+        response = author.post(
+            reverse("posts:post_create"), {"text": "Свой"}
+        )
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.texts(author), ["Свой", "Новый", "Старый"])
+        self.assertEqual(self.texts(Client()), ["Старый"])
+
+        replicas.sync()
+        self.assertEqual(
+            self.texts(Client()), ["Свой", "Новый", "Старый"]
+        )
+
+    def test_lagging_replica_not_cached(self):
+        """Карточка и страница, собранные по реплике, которая ещё не
+        видела правку, не остаются в кеше под новой версией."""
+        post = Post.objects.get()
+        self.assertContains(self.client.get("/"), "Старый")
+        post.text = "Исправленный"
+        post.save()
+        self.assertContains(self.client.get("/"), "Старый")
+        self.assertContains(self.client.get("/", {"fresh": 1}), "Старый")
+        replicas.sync()
+        for params in ({}, {"fresh": 2}):
+            with self.subTest(params=params):
+                response = Client().get("/", params)
+                self.assertContains(response, "Исправленный")
+                self.assertNotContains(response, "Старый")
+
+
+calls = []
+
+
+@jobs.task("core.tests.record", retries=2)
+def record(value):
+    if value == "ошибка":
+        raise ValueError(value)
+    calls.append(value)
+
+
+@jobs.task("core.tests.record_batch", batch=True, retries=1)
+def record_batch(payloads):
+    values = [payload["value"] for payload in payloads]
+    if "ошибка" in values:
+        raise ValueError("ошибка")
+    calls.append(values)
+
+
+@override_settings(JOBS_ALWAYS_EAGER=False)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_eager_mode_runs_inline(self):
+        with self.settings(JOBS_ALWAYS_EAGER=True):
+            record.delay(value="сразу")
+        self.assertEqual(calls, ["сразу"])
+        self.assertFalse(Job.objects.exists())
+
+    def test_worker_runs_and_deletes_jobs(self):
+        record.delay(value="первый")
+        record.delay(value="второй")
+        self.assertEqual(calls, [])
+        out = StringIO()
+        call_command("run_jobs", "--once", stdout=out)
+        self.assertEqual(calls, ["первый", "второй"])
+        self.assertIn("2", out.getvalue())
+        self.assertFalse(Job.objects.exists())
+
+    def test_batch_task_gets_all_payloads(self):
+        for value in range(3):
+            record_batch.delay(value=value)
+        self.assertEqual(jobs.run_pending(limit=10), 3)
+        self.assertEqual(calls, [[0, 1, 2]])
+
+    def test_failed_payload_fails_only_its_job(self):
+        """Упавшая пачка выполняется по одной: остальные задачи проходят,
+        падает только задача с плохими аргументами."""
+        for value in (0, "ошибка", 2):
+            record_batch.delay(value=value)
+        with self.assertLogs("core.jobs", "ERROR"):
+            self.assertEqual(jobs.run_pending(limit=10), 3)
+        self.assertEqual(calls, [[0], [2]])
+        job = Job.objects.get()
+        self.assertTrue(job.failed)
+        self.assertEqual(json.loads(job.payload), {"value": "ошибка"})
+
+    def test_key_deduplicates_waiting_jobs(self):
+        record.delay(key="k", value="раз")
+        record.delay(key="k", value="два")
+        self.assertEqual(Job.objects.count(), 1)
+        # Уникальность держит база, а не проверка перед вставкой.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(name="core.tests.record", key="k")
+        Job.objects.update(failed=True)
+        record.delay(key="k", value="три")
+        self.assertEqual(Job.objects.filter(failed=False).count(), 1)
+
+    def test_failed_job_retried_then_kept(self):
+        record.delay(value="ошибка")
+        with self.assertLogs("core.jobs", "ERROR"):
+            jobs.run_pending()
+        job = Job.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(job.failed)
+        self.assertIn("ValueError", job.last_error)
+        # Повтор — только после паузы.
+        self.assertEqual(jobs.run_pending(), 0)
+        Job.objects.update(run_at=job.created)
+        with self.assertLogs("core.jobs", "ERROR"):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertTrue(job.failed)
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_claimed_jobs_skipped_by_other_workers(self):
+        record.delay(value="один")
+        self.assertEqual(len(jobs.claim("first", 10)), 1)
+        self.assertEqual(jobs.claim("second", 10), [])
@@ -1,9 +1,19 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group, Follow, Comment
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список для больших таблиц: связи одним JOIN, виджеты связей без
+    выпадающих списков на всю таблицу и без полного COUNT(*)."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,10 +21,22 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
+    # Поиск идёт по индексу слов (posts.search), число — это id поста.
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return queryset.filter(
+            pk__in=search.matching_post_ids(search_term)
+        ), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -25,11 +47,25 @@ class GroupAdmin(admin.ModelAdmin):
         'slug',
     )
     list_editable = ('title',)
-    search_fields = ('description',)
+    search_fields = ('title', 'description')
     empty_value_display = '-пусто-'
 
 
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author', 'post')
+    search_fields = ('=author__username',)
+
+
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
-admin.site.register(Follow)
-admin.site.register(Comment)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,165 @@
+"""Read-only JSON API лент для мобильного клиента.
+
+Строки берутся через values(): без создания моделей и без шаблонов.
+Ленты листаются курсором ``?cursor=`` (как HTML-ленты), набор полей
+задаётся ``?fields=id,text,author``. Публичные ответы кешируются и
+отдают ETag/Last-Modified тем же public_page, что и HTML-страницы.
+"""
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from .models import Comment, Group, Post, User
+from .page_cache import (group_scope, index_scope, post_scope,
+                         profile_scope, public_page)
+from .paginators import KeysetPaginator
+from .timeline import FEED_ORDERING, timeline_posts
+
+POSTS_PER_PAGE: int = 20
+COMMENTS_PER_PAGE: int = 20
+
+# Поле ответа: выражение для values().
+POST_FIELDS = {
+    "id": "id",
+    "text": "text",
+    "pub_date": "pub_date",
+    "author": "author__username",
+    "author_name": "author__first_name",
+    "author_surname": "author__last_name",
+    "group": "group__slug",
+    "group_title": "group__title",
+    "image": "image",
+    "image_width": "image_width",
+    "image_height": "image_height",
+    "comments_count": "comments_count",
+}
+COMMENT_FIELDS = {
+    "id": "id",
+    "author": "author__username",
+    "text": "text",
+    "created": "created",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_fields(request, available):
+    """Поля из ``?fields=``; без параметра — все."""
+    raw = request.GET.get("fields")
+    if not raw:
+        return list(available)
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}.")
+    return list(dict.fromkeys(fields))
+
+
+def _plain(name, value):
+    if value is None:
+        return None
+    if name == "image":
+        return default_storage.url(value) if value else None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def serialize(row, fields, available):
+    return {
+        name: _plain(name, row[available[name]]) for name in fields
+    }
+
+
+def page_of(queryset, request, fields, available, per_page, ordering):
+    """Страница по курсору: колонки ключа выбираются всегда, а в ответ
+    попадают только запрошенные поля."""
+    columns = {available[name] for name in fields}
+    columns.update(name.lstrip("-") for name in ordering)
+    paginator = KeysetPaginator(
+        queryset.values(*columns), per_page, ordering=ordering
+    )
+    page = paginator.get_page(request.GET.get("cursor"))
+    return {
+        "results": [serialize(row, fields, available) for row in page],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    }
+
+
+def posts_page(queryset, request, ordering=("-pub_date", "-id")):
+    fields = parse_fields(request, POST_FIELDS)
+    return page_of(
+        queryset, request, fields, POST_FIELDS, POSTS_PER_PAGE, ordering
+    )
+
+
+def api_view(view):
+    """Ответ view — JSON; ApiError превращается в ответ с ошибкой."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse(
+                {"error": str(error)},
+                status=error.status,
+                json_dumps_params={"ensure_ascii": False},
+            )
+        return JsonResponse(data, json_dumps_params={"ensure_ascii": False})
+    return wrapper
+
+
+@public_page(index_scope)
+@api_view
+def index(request):
+    return posts_page(Post.objects.all(), request)
+
+
+@public_page(group_scope)
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only("pk"), slug=slug)
+    return posts_page(Post.objects.filter(group=group), request)
+
+
+@public_page(profile_scope)
+@api_view
+def profile(request, username):
+    author = get_object_or_404(User.objects.only("pk"), username=username)
+    return posts_page(Post.objects.filter(author=author), request)
+
+
+@public_page(post_scope)
+@api_view
+def post_detail(request, post_id):
+    """Пост и первая (или по курсору — следующая) пачка комментариев."""
+    fields = parse_fields(request, POST_FIELDS)
+    post = get_object_or_404(
+        Post.objects.values(*{POST_FIELDS[name] for name in fields}),
+        pk=post_id,
+    )
+    comments = page_of(
+        Comment.objects.filter(post_id=post_id),
+        request, list(COMMENT_FIELDS), COMMENT_FIELDS,
+        COMMENTS_PER_PAGE, ("created", "id"),
+    )
+    return {
+        "post": serialize(post, fields, POST_FIELDS),
+        "comments": comments,
+    }
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError("Нужна авторизация.", status=401)
+    return posts_page(
+        timeline_posts(request.user), request, ordering=FEED_ORDERING
+    )
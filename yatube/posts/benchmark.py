@@ -0,0 +1,431 @@
+"""Нагрузочный прогон страниц: запросы к БД, строки, рендер, задержки.
+
+seed() наполняет базу правдоподобным объёмом данных, run() обходит все
+именованные маршруты posts, users и about и снимает метрики, compare()
+сравнивает результат с сохранённым эталоном. mixed_traffic() нагружает
+страницы одновременным чтением и записью из нескольких потоков.
+"""
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+
+from core import profiling
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connections, models
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from faker import Faker
+
+from . import search
+from .models import (AuthorStats, Comment, Follow, Group, Post, SearchTerm,
+                     TimelineEntry)
+
+User = get_user_model()
+
+URLCONFS = ("posts.urls", "users.urls", "about.urls")
+
+# На какую долю могут вырасти строки и p95, прежде чем это регрессия.
+DEFAULT_THRESHOLD: float = 0.2
+
+
+def isolated_caches(directory):
+    """Кеши прогона в отдельном каталоге, чтобы не смешиваться с кешем
+    рабочего сайта."""
+    return {
+        "default": {
+            "BACKEND": "core.cache.TieredCache",
+            "OPTIONS": {"SHARED": "shared", "LOCAL_TIMEOUT": 5},
+        },
+        "shared": {
+            "BACKEND": "core.cache.SQLiteCache",
+            "LOCATION": os.path.join(directory, "cache.sqlite3"),
+        },
+    }
+
+
+def seed(users=10000, posts=100000, follows=1000000, groups=50,
+         comments=20000, batch_size=None, random_seed=0):
+    """Наполняет базу данными напрямую через bulk_create и затем
+    достраивает то, что обычно ведут сигналы: счётчики, ленты, индекс."""
+    rng = random.Random(random_seed)
+    fake = Faker("ru_RU")
+    fake.seed_instance(random_seed)
+    password = make_password(None)
+    User.objects.bulk_create(
+        (
+            User(
+                username=f"user{i}",
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                password=password,
+            )
+            for i in range(users)
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.values_list("pk", flat=True))
+    Group.objects.bulk_create(
+        (
+            Group(title=fake.sentence(nb_words=3)[:200], slug=f"group-{i}",
+                  description=fake.paragraph())
+            for i in range(groups)
+        ),
+        batch_size=batch_size,
+    )
+    group_ids = list(Group.objects.values_list("pk", flat=True)) + [None]
+    now = timezone.now()
+    Post.objects.bulk_create(
+        (
+            Post(
+                text=fake.paragraph(nb_sentences=5),
+                author_id=rng.choice(user_ids),
+                group_id=rng.choice(group_ids),
+            )
+            for _ in range(posts)
+        ),
+        batch_size=batch_size,
+    )
+    post_ids = list(Post.objects.values_list("pk", flat=True))
+    Comment.objects.bulk_create(
+        (
+            Comment(text=fake.sentence(), author_id=rng.choice(user_ids),
+                    post_id=rng.choice(post_ids))
+            for _ in range(comments)
+        ),
+        batch_size=batch_size,
+    )
+    follows = min(follows, len(user_ids) * (len(user_ids) - 1))
+    pairs = set()
+    while len(pairs) < follows:
+        user_id, author_id = rng.sample(user_ids, 2)
+        pairs.add((user_id, author_id))
+    Follow.objects.bulk_create(
+        (Follow(user_id=u, author_id=a) for u, a in pairs),
+        batch_size=batch_size,
+    )
+    # auto_now_add при bulk_create ставит всем постам текущее время,
+    # а лентам и курсорам нужен разброс дат.
+    Post.objects.bulk_update(
+        [
+            Post(pk=pk, pub_date=now - timedelta(minutes=n))
+            for n, pk in enumerate(sorted(post_ids, reverse=True))
+        ],
+        ["pub_date"],
+        batch_size=batch_size,
+    )
+    call_command("recount_counters", stdout=StringIO())
+    _build_timelines(batch_size)
+    _build_search_index(batch_size)
+
+
+def _build_timelines(batch_size):
+    prolific = set(
+        AuthorStats.objects.filter(read_on_the_fly=True)
+        .values_list("user_id", flat=True)
+    )
+    followers = {}
+    for user_id, author_id in Follow.objects.values_list(
+        "user_id", "author_id"
+    ).iterator():
+        if author_id not in prolific:
+            followers.setdefault(author_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, author_id, pub_date in Post.objects.values_list(
+                "pk", "author_id", "pub_date"
+            ).iterator()
+            for user_id in followers.get(author_id, ())
+        ),
+        batch_size=batch_size,
+    )
+
+
+def _build_search_index(batch_size):
+    comments = {}
+    for post_id, text in Comment.objects.values_list("post_id", "text"):
+        comments.setdefault(post_id, []).append(text)
+    SearchTerm.objects.bulk_create(
+        (
+            SearchTerm(post_id=post_id, term=term, weight=weight)
+            for post_id, text in Post.objects.values_list(
+                "pk", "text"
+            ).iterator()
+            for term, weight in search.post_weights(
+                text, comments.get(post_id, ())
+            ).items()
+        ),
+        batch_size=batch_size,
+    )
+
+
+def samples():
+    """Образцы для аргументов маршрутов: самый обсуждаемый пост, самый
+    плодовитый автор и самая большая группа."""
+    return {
+        "post": Post.objects.order_by("-comments_count", "-pk").first(),
+        "author": User.objects.order_by(
+            "-stats__posts_count", "pk"
+        ).first(),
+        "group": Group.objects.annotate(
+            total=models.Count("posts")
+        ).order_by("-total", "pk").first(),
+    }
+
+
+def routes(post=None, author=None, group=None):
+    """Имена и адреса всех именованных маршрутов из URLCONFS; маршруты,
+    для аргументов которых нет образца, пропускаются."""
+    values = {
+        "post_id": post and post.pk,
+        "username": author and author.username,
+        "slug": group and group.slug,
+    }
+    # Поиску нужен запрос, иначе страница пустая: берём слово из поста.
+    queries = {
+        "posts:search": post and urlencode(
+            {"q": max(post.text.split(), key=len)}
+        ),
+    }
+    result = []
+    for urlconf in URLCONFS:
+        module = import_module(urlconf)
+        for pattern in module.urlpatterns:
+            if not pattern.name:
+                continue
+            kwargs = {
+                name: values.get(name) for name in pattern.pattern.converters
+            }
+            if None in kwargs.values():
+                continue
+            name = f"{module.app_name}:{pattern.name}"
+            url = reverse(name, kwargs=kwargs)
+            if queries.get(name):
+                url = f"{url}?{queries[name]}"
+            result.append((name, url))
+    return result
+
+
+def measure(url, client, repeat=20, before=None):
+    """Метрики одного адреса: первый запрос прогревает кеши, дальше
+    repeat замеров. before() вызывается перед каждым запросом вне
+    замера."""
+    latencies = []
+    renders = []
+    queries = rows = status = 0
+    for attempt in range(repeat + 1):
+        if before is not None:
+            before()
+        with profiling.capture() as profile:
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - start
+        if not attempt:
+            continue
+        latencies.append(elapsed * 1000)
+        renders.append(profile.render * 1000)
+        queries = max(queries, len(profile.queries))
+        rows = max(rows, profile.rows)
+        status = response.status_code
+    return {
+        "status": status,
+        "queries": queries,
+        "rows": rows,
+        "render_ms": round(statistics.median(renders), 3),
+        "p50_ms": round(profiling.percentile(latencies, 0.5), 3),
+        "p95_ms": round(profiling.percentile(latencies, 0.95), 3),
+    }
+
+
+def run(repeat=20, cold=False, only=None, as_user=False):
+    """Обходит маршруты и возвращает словарь {имя: метрики}.
+
+    Маршрут меряется анонимно, а если аноним уходит на страницу входа
+    или задан as_user — от имени автора образцового поста. cold — чистить
+    кеш перед каждым запросом.
+    """
+    sample = samples()
+    viewer = sample["post"] and sample["post"].author
+    login_url = reverse(settings.LOGIN_URL)
+    results = {}
+    for name, url in routes(**sample):
+        if only and name not in only:
+            continue
+        client = Client()
+        response = client.get(url)
+        redirected = response.status_code == 302 and response.url.startswith(
+            login_url
+        )
+        login = viewer if as_user or redirected else None
+
+        def before(login=login, name=name):
+            if cold:
+                caches["default"].clear()
+            if login is None:
+                return
+            # Выход — тоже маршрут, поэтому входим перед каждым запросом.
+            client.force_login(login)
+            if name == "posts:profile_unfollow":
+                Follow.objects.get_or_create(
+                    user=login, author=sample["author"]
+                )
+
+        results[name] = {
+            "url": url,
+            "user": login is not None,
+            **measure(url, client, repeat=repeat, before=before),
+        }
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Список регрессий относительно эталона: число запросов не должно
+    расти вовсе, строки и p95 — не больше чем на долю threshold."""
+    problems = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["queries"] > previous["queries"]:
+            problems.append(
+                f"{name}: запросов {previous['queries']} → "
+                f"{current['queries']}"
+            )
+        for metric in ("rows", "p95_ms"):
+            if current[metric] > previous[metric] * (1 + threshold):
+                problems.append(
+                    f"{name}: {metric} {previous[metric]} → "
+                    f"{current[metric]}"
+                )
+    return problems
+
+
+class Traffic:
+    """Итоги потоков mixed_traffic: задержки чтения и записи и ошибки."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {"read": [], "write": []}
+        self.errors = {"read": 0, "write": 0}
+        self.locked = 0
+
+    def record(self, kind, seconds, ok):
+        with self.lock:
+            self.latencies[kind].append(seconds * 1000)
+            self.errors[kind] += not ok
+
+    def fail(self, kind, error):
+        with self.lock:
+            self.errors[kind] += 1
+            self.locked += isinstance(error, OperationalError)
+
+    def summary(self, elapsed):
+        result = {"seconds": round(elapsed, 2), "locked": self.locked}
+        for kind, latencies in self.latencies.items():
+            result[kind] = {
+                "requests": len(latencies),
+                "errors": self.errors[kind],
+                "rps": round(len(latencies) / elapsed, 1),
+                "p50_ms": round(profiling.percentile(latencies, 0.5), 3)
+                if latencies else None,
+                "p95_ms": round(profiling.percentile(latencies, 0.95), 3)
+                if latencies else None,
+            }
+        return result
+
+
+def _reader(traffic, deadline, user, posts, authors, groups, rng):
+    client = Client()
+    # Вошедший читатель минует кеш публичных страниц и ходит в базу.
+    client.force_login(user)
+    while time.monotonic() < deadline:
+        url = rng.choice((
+            lambda: reverse("posts:index"),
+            lambda: reverse("posts:post_detail", args=(rng.choice(posts),)),
+            lambda: reverse("posts:profile", args=(rng.choice(authors),)),
+            lambda: reverse("posts:group_list", args=(rng.choice(groups),)),
+            lambda: reverse("posts:follow_index"),
+        ))()
+        start = time.perf_counter()
+        try:
+            response = client.get(url)
+        except Exception as error:
+            traffic.fail("read", error)
+            continue
+        traffic.record(
+            "read", time.perf_counter() - start, response.status_code == 200
+        )
+
+
+def _writer(traffic, deadline, user, posts, rng, post_share):
+    client = Client()
+    client.force_login(user)
+    while time.monotonic() < deadline:
+        if rng.random() < post_share:
+            url, data = reverse("posts:post_create"), {"text": "Нагрузка"}
+        else:
+            url = reverse("posts:add_comment", args=(rng.choice(posts),))
+            data = {"text": "Нагрузка"}
+        start = time.perf_counter()
+        try:
+            response = client.post(url, data)
+        except Exception as error:
+            traffic.fail("write", error)
+            continue
+        traffic.record(
+            "write", time.perf_counter() - start, response.status_code == 302
+        )
+
+
+def _worker(target, *args):
+    try:
+        target(*args)
+    finally:
+        connections.close_all()
+
+
+def mixed_traffic(seconds=10, readers=8, writers=2, post_share=0.2,
+                  random_seed=0):
+    """Читатели и писатели в отдельных потоках в течение seconds секунд.
+    Писатели оставляют комментарии и (с долей post_share) публикуют посты.
+    """
+    rng = random.Random(random_seed)
+    posts = list(Post.objects.values_list("pk", flat=True)[:1000])
+    authors = list(
+        User.objects.filter(stats__posts_count__gt=0)
+        .values_list("username", flat=True)[:1000]
+    )
+    groups = list(Group.objects.values_list("slug", flat=True))
+    users = list(User.objects.order_by("pk")[:readers + writers])
+    traffic = Traffic()
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(target=_worker, args=(
+            _reader, traffic, deadline, users[i % len(users)], posts,
+            authors, groups, random.Random(rng.random()),
+        ))
+        for i in range(readers)
+    ] + [
+        threading.Thread(target=_worker, args=(
+            _writer, traffic, deadline, users[-1 - i % len(users)], posts,
+            random.Random(rng.random()), post_share,
+        ))
+        for i in range(writers)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return traffic.summary(time.monotonic() - start)
@@ -0,0 +1,72 @@
+import time
+
+from core import replicas
+from core.cache import get_or_set_once
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import get_template
+
+CARD_TEMPLATE = "posts/includes/post_card.html"
+CARD_TIMEOUT: int = 60 * 60 * 24
+
+
+def _post_version_key(post_id):
+    return f"post_card_version:{post_id}"
+
+
+def _group_version_key(group_id):
+    return f"group_card_version:{group_id}"
+
+
+def _bump(key):
+    cache.set(key, time.time_ns(), None)
+    # Запрос, прочитавший запись до фиксации транзакции, мог положить
+    # старую карточку уже под новой версией: после фиксации версия
+    # меняется ещё раз.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(
+            lambda: cache.set(key, time.time_ns(), None)
+        )
+
+
+def invalidate_post(post_id):
+    _bump(_post_version_key(post_id))
+
+
+def invalidate_group(group_id):
+    _bump(_group_version_key(group_id))
+
+
+def _versions(post):
+    version_keys = [_post_version_key(post.pk)]
+    if post.group_id:
+        version_keys.append(_group_version_key(post.group_id))
+    versions = cache.get_many(version_keys)
+    return [versions.get(key, 0) for key in version_keys]
+
+
+def card_key(post, versions=None):
+    """Ключ карточки: id поста плюс версии поста и его группы."""
+    if versions is None:
+        versions = _versions(post)
+    return "post_card:{}:{}".format(post.pk, ":".join(map(str, versions)))
+
+
+def render_card(post, lazy=True):
+    """HTML карточки поста, общий для всех лент и пользователей.
+    Картинку карточек ниже первого экрана браузер грузит лениво.
+    Карточка, собранная по отстающей реплике, в кеш не кладётся."""
+    versions = _versions(post)
+    key = card_key(post, versions)
+    if not lazy:
+        key = f"{key}:eager"
+
+    def render():
+        return get_template(CARD_TEMPLATE).render(
+            {"post": post, "lazy": lazy}
+        )
+
+    if replicas.lagging(max(versions) / 1e9):
+        html = cache.get(key)
+        return render() if html is None else html
+    return get_or_set_once(key, render, CARD_TIMEOUT)
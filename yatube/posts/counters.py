@@ -0,0 +1,75 @@
+from django.db.models import Count, F
+
+from .models import AuthorStats, Follow, Post
+
+
+def actual_stats(user_id):
+    """Считает счётчики пользователя по исходным таблицам."""
+    return {
+        "posts_count": Post.objects.filter(author_id=user_id).count(),
+        "followers_count": Follow.objects.filter(author_id=user_id).count(),
+        "following_count": Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def recount_user(user_id):
+    stats, _ = AuthorStats.objects.update_or_create(
+        user_id=user_id, defaults=actual_stats(user_id)
+    )
+    return stats
+
+
+def get_stats(user):
+    """Счётчики пользователя; недостающая строка пересчитывается."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        user.stats = recount_user(user.pk)
+        return user.stats
+
+
+def change_stats(user_id, field, delta):
+    """Сдвигает счётчик пользователя на delta.
+
+    Если строки ещё нет, при увеличении она создаётся пересчётом; при
+    уменьшении ничего не делаем — строка посчитается при чтении.
+    """
+    if user_id is None:
+        return
+    queryset = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    updated = queryset.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        recount_user(user_id)
+
+
+def change_comments_count(post_id, delta):
+    queryset = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        queryset = queryset.filter(comments_count__gte=-delta)
+    queryset.update(comments_count=F("comments_count") + delta)
+
+
+def _totals(queryset, field):
+    return dict(
+        queryset.filter(**{f"{field}__isnull": False})
+        .order_by()
+        .values_list(field)
+        .annotate(Count("pk"))
+    )
+
+
+def actual_stats_bulk():
+    """Счётчики всех пользователей тремя агрегирующими запросами."""
+    posts = _totals(Post.objects, "author")
+    followers = _totals(Follow.objects, "author")
+    following = _totals(Follow.objects, "user")
+    return {
+        user_id: {
+            "posts_count": posts.get(user_id, 0),
+            "followers_count": followers.get(user_id, 0),
+            "following_count": following.get(user_id, 0),
+        }
+        for user_id in set(posts) | set(followers) | set(following)
+    }
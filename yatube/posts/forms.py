@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 
+from . import images
 from .models import Post, Comment
 
 
@@ -17,6 +19,23 @@ class PostForm(forms.ModelForm):
             'group': _('Group to which this post belongs to'),
         }
 
+    def clean_image(self):
+        """Новую картинку сразу уменьшает и перекодирует (posts.images)
+        и запоминает её размеры."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                image, width, height = images.process(image)
+            except images.ImageError:
+                raise forms.ValidationError(
+                    _('Не удалось обработать изображение.')
+                )
+            self.instance.image_width = width
+            self.instance.image_height = height
+        elif not image:
+            self.instance.image_width = self.instance.image_height = None
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
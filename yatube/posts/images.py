@@ -0,0 +1,49 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Большая сторона сохраняемого изображения: с запасом для ленты
+# (thumbnails.FEED_GEOMETRY) и страницы поста.
+MAX_SIDE: int = 2048
+FORMAT = "WEBP"
+EXTENSION = ".webp"
+QUALITY: int = 82
+
+
+class ImageError(ValueError):
+    pass
+
+
+def process(upload):
+    """Готовит загруженную картинку к хранению: поворот по EXIF,
+    уменьшение до MAX_SIDE, перекодирование в WebP без метаданных.
+    Возвращает файл для ImageField и его ширину и высоту."""
+    try:
+        image = Image.open(upload)
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft("RGB", (MAX_SIDE, MAX_SIDE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ImageError(str(error)) from error
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = image.mode in ("LA", "PA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    buffer = BytesIO()
+    # exif не передаём — метаданные в файл не попадают.
+    image.save(buffer, FORMAT, quality=QUALITY, method=4)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + EXTENSION
+    return ContentFile(buffer.getvalue(), name=name), image.width, image.height
+
+
+def dimensions(file):
+    """Ширина и высота уже сохранённой картинки по её заголовку."""
+    try:
+        with Image.open(file) as image:
+            return image.size
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ImageError(str(error)) from error
@@ -0,0 +1,133 @@
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет отдельную тестовую базу и меряет запросы, строки, "
+        "рендер и задержки для всех именованных маршрутов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--follows", type=int, default=1000000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument(
+            "--batch-size", type=int,
+            help="Размер пачки bulk_create; по умолчанию — предел базы.",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="Сколько замеров на маршрут, не считая прогрева.",
+        )
+        parser.add_argument(
+            "--route", action="append", dest="routes",
+            help="Мерить только этот маршрут (posts:index); можно повторять.",
+        )
+        parser.add_argument(
+            "--cold", action="store_true",
+            help="Чистить кеш перед каждым запросом.",
+        )
+        parser.add_argument(
+            "--as-user", action="store_true",
+            help="Мерить все маршруты от имени пользователя, в обход "
+                 "кеша публичных страниц.",
+        )
+        parser.add_argument(
+            "--output", help="Куда записать JSON; по умолчанию в stdout.",
+        )
+        parser.add_argument(
+            "--baseline", help="JSON прошлого прогона для сравнения.",
+        )
+        parser.add_argument(
+            "--threshold", type=float, default=benchmark.DEFAULT_THRESHOLD,
+            help="Допустимый рост строк и p95 в долях (0.2 — на 20%%).",
+        )
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="Не удалять тестовую базу и не наполнять её повторно.",
+        )
+        parser.add_argument(
+            "--database-name",
+            help="Имя тестовой базы (для SQLite — файл, нужен с --keepdb).",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)["routes"]
+        if options["database_name"]:
+            connection.settings_dict["TEST"]["NAME"] = (
+                options["database_name"]
+            )
+        cache_dir = tempfile.mkdtemp()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            with override_settings(
+                CACHES=benchmark.isolated_caches(cache_dir)
+            ):
+                report = self.collect(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if baseline is not None:
+            problems = benchmark.compare(
+                report["routes"], baseline, options["threshold"]
+            )
+            if problems:
+                raise CommandError(
+                    "Регрессии относительно эталона:\n" + "\n".join(problems)
+                )
+
+    def collect(self, options):
+        if not Post.objects.exists():
+            benchmark.seed(
+                users=options["users"],
+                posts=options["posts"],
+                follows=options["follows"],
+                groups=options["groups"],
+                comments=options["comments"],
+                batch_size=options["batch_size"],
+            )
+        return {
+            "volumes": {
+                "users": User.objects.count(),
+                "posts": Post.objects.count(),
+                "follows": Follow.objects.count(),
+                "groups": Group.objects.count(),
+                "comments": Comment.objects.count(),
+            },
+            "repeat": options["repeat"],
+            "cold": options["cold"],
+            "as_user": options["as_user"],
+            "routes": benchmark.run(
+                repeat=options["repeat"],
+                cold=options["cold"],
+                only=options["routes"],
+                as_user=options["as_user"],
+            ),
+        }
@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+from posts.models import Post
+
+# Наборы прагм для сравнения: tuned — core.db.PRAGMAS как есть, stock —
+# умолчания SQLite (busy_timeout 5 с — как timeout модуля sqlite3).
+PROFILES = {
+    "tuned": {},
+    "stock": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет файловую тестовую базу и нагружает страницы постов "
+        "одновременным чтением и записью для каждого набора прагм SQLite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--comments", type=int, default=5000)
+        parser.add_argument(
+            "--seconds", type=float, default=10,
+            help="Длительность прогона для каждого набора прагм.",
+        )
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument(
+            "--profile", nargs="+", choices=sorted(PROFILES),
+            default=["stock", "tuned"],
+            help="Наборы прагм: tuned (WAL и пр.) и stock (умолчания).",
+        )
+        parser.add_argument(
+            "--output", help="Куда записать JSON; по умолчанию в stdout.",
+        )
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="Не удалять тестовую базу и не наполнять её повторно.",
+        )
+        parser.add_argument(
+            "--database-name",
+            help="Файл тестовой базы; по умолчанию во временном каталоге.",
+        )
+
+    def handle(self, *args, **options):
+        work_dir = tempfile.mkdtemp()
+        # WAL и блокировки имеют смысл только для базы в файле.
+        connection.settings_dict["TEST"]["NAME"] = (
+            options["database_name"]
+            or os.path.join(work_dir, "benchmark.sqlite3")
+        )
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            with override_settings(
+                CACHES=benchmark.isolated_caches(work_dir)
+            ):
+                report = self.collect(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def collect(self, options):
+        if not Post.objects.exists():
+            benchmark.seed(
+                users=options["users"],
+                posts=options["posts"],
+                follows=options["follows"],
+                groups=options["groups"],
+                comments=options["comments"],
+            )
+        report = {}
+        for profile in options["profile"]:
+            with override_settings(SQLITE_PRAGMAS=PROFILES[profile]):
+                # Прагмы выставляются при открытии соединения.
+                connections.close_all()
+                connection.ensure_connection()
+                report[profile] = benchmark.mixed_traffic(
+                    seconds=options["seconds"],
+                    readers=options["readers"],
+                    writers=options["writers"],
+                )
+            connections.close_all()
+        return report
@@ -0,0 +1,64 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоково выгружает посты, комментарии или подписки в JSONL/CSV, "
+        "целиком или начиная с отметки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(export.TABLES))
+        parser.add_argument(
+            "--format", choices=sorted(export.FORMATS), default="jsonl"
+        )
+        parser.add_argument(
+            "--gzip", action="store_true", help="Сжимать выгрузку gzip.",
+        )
+        parser.add_argument(
+            "--since",
+            help="Только записи с датой не раньше этой (ISO 8601).",
+        )
+        parser.add_argument(
+            "--after-id", type=int,
+            help="Только записи с id больше этого (отметка прошлой выгрузки).",
+        )
+        parser.add_argument(
+            "--output", help="Файл выгрузки; по умолчанию stdout.",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = export.parse_since(options["since"])
+            except ValueError:
+                raise CommandError("Неверная дата в --since.")
+        upto_id = export.watermark(options["table"])
+        chunks = export.export(
+            options["table"],
+            fmt=options["format"],
+            gzip=options["gzip"],
+            since=since,
+            after_id=options["after_id"],
+            upto_id=upto_id,
+        )
+        if options["output"]:
+            mode = "wb" if options["gzip"] else "w"
+            encoding = None if options["gzip"] else "utf-8"
+            with open(options["output"], mode, encoding=encoding) as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        elif options["gzip"]:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+        self.stderr.write(
+            f"Отметка для следующей выгрузки: --after-id {upto_id}"
+        )
@@ -0,0 +1,232 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Max, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import (counters, images, page_cache, paginators, search,
+                   timeline)
+from posts.models import Group, ImportProgress, Post, User
+
+
+class SkipRecord(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует посты из JSONL или CSV (text, author, group, pub_date, "
+        "image) пачками, с возможностью продолжить после обрыва."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл .jsonl или .csv.")
+        parser.add_argument(
+            "--format", choices=("jsonl", "csv"),
+            help="Формат файла; по умолчанию — по расширению.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--source",
+            help="Ключ сохранённого прогресса; по умолчанию — полный "
+                 "путь к файлу.",
+        )
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Начать сначала, не глядя на сохранённый прогресс.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"Файл {path} не найден.")
+        fmt = options["format"] or (
+            "csv" if path.lower().endswith(".csv") else "jsonl"
+        )
+        self.source = options["source"] or os.path.abspath(path)
+        progress = ImportProgress.objects.filter(source=self.source)
+        if options["restart"]:
+            progress.delete()
+        done = progress.values_list("done", flat=True).first() or 0
+        self.authors = {}
+        self.groups = {}
+        self.skipped = Counter()
+        self.touched = set()
+        imported = 0
+        started = time.monotonic()
+        with open(path, newline="", encoding="utf-8") as file:
+            records = islice(self.read(file, fmt), done, None)
+            if done:
+                self.stdout.write(f"Продолжаем с записи {done + 1}.")
+            while True:
+                batch = list(islice(records, options["batch_size"]))
+                if not batch:
+                    break
+                done += len(batch)
+                imported += self.import_batch(batch, done)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"Обработано {done}, добавлено {imported} "
+                    f"({imported / elapsed:.0f} пост/с)."
+                )
+        progress.delete()
+        page_cache.touch(self.touched)
+        skipped = ", ".join(f"{r}: {n}" for r, n in self.skipped.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: добавлено {imported} постов за "
+            f"{time.monotonic() - started:.1f} с."
+            + (f" Пропущено — {skipped}." if skipped else "")
+        ))
+
+    def read(self, file, fmt):
+        if fmt == "csv":
+            yield from csv.DictReader(file)
+            return
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                yield {}
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                self.stderr.write(f"Строка {number}: не JSON.")
+                yield {}
+
+    def resolve(self, batch):
+        """Догружает в кеш авторов и группы пачки одним запросом на вид."""
+        usernames = {r.get("author") for r in batch} - set(self.authors)
+        self.authors.update(dict.fromkeys(usernames))
+        self.authors.update(
+            User.objects.filter(username__in=usernames)
+            .values_list("username", "pk")
+        )
+        slugs = {r.get("group") for r in batch if r.get("group")}
+        slugs -= set(self.groups)
+        self.groups.update(dict.fromkeys(slugs))
+        self.groups.update(
+            Group.objects.filter(slug__in=slugs).values_list("slug", "pk")
+        )
+
+    def build(self, record):
+        text = (record.get("text") or "").strip()
+        if not text:
+            raise SkipRecord("нет текста")
+        author_id = self.authors.get(record.get("author"))
+        if author_id is None:
+            raise SkipRecord("неизвестный автор")
+        group_id = None
+        if record.get("group"):
+            group_id = self.groups.get(record["group"])
+            if group_id is None:
+                raise SkipRecord("неизвестная группа")
+        pub_date = None
+        if record.get("pub_date"):
+            try:
+                pub_date = parse_datetime(record["pub_date"])
+            except ValueError:
+                pub_date = None
+            if pub_date is None:
+                raise SkipRecord("неверная дата")
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        image, width, height = self.store_image(record.get("image"))
+        return Post(
+            text=text,
+            author_id=author_id,
+            group_id=group_id,
+            pub_date=pub_date,
+            image=image,
+            image_width=width,
+            image_height=height,
+        )
+
+    def store_image(self, image):
+        """Внешний файл обрабатывается, как загрузка из формы
+        (posts.images), и копируется в хранилище. Путь внутри MEDIA_ROOT
+        указывает на уже загруженную через сайт картинку: он сохраняется
+        как есть, размеры читаются из файла. Возвращает имя, ширину и
+        высоту."""
+        if not image:
+            return "", None, None
+        if not os.path.isabs(image):
+            try:
+                with default_storage.open(image) as file:
+                    return (image, *images.dimensions(file))
+            except (OSError, images.ImageError):
+                return image, None, None
+        if not os.path.exists(image):
+            raise SkipRecord("нет файла картинки")
+        with open(image, "rb") as file:
+            try:
+                content, width, height = images.process(File(file))
+            except images.ImageError:
+                raise SkipRecord("не картинка")
+        name = default_storage.save(f"posts/{content.name}", content)
+        return name, width, height
+
+    @staticmethod
+    def restore_pub_dates(created, dates):
+        """bulk_create ставит pub_date по auto_now_add; даты из файла
+        возвращаются одним UPDATE на пачку."""
+        dated = [
+            (post, date) for post, date in zip(created, dates) if date
+        ]
+        changed = [
+            When(pk=post.pk, then=Value(date, output_field=DateTimeField()))
+            for post, date in dated
+        ]
+        if changed:
+            Post.objects.filter(pk__in=[post.pk for post, _ in dated]).update(
+                pub_date=Case(*changed, default="pub_date")
+            )
+        for post, date in dated:
+            post.pub_date = date
+
+    def import_batch(self, batch, done):
+        self.resolve(batch)
+        posts = []
+        for record in batch:
+            try:
+                posts.append(self.build(record))
+            except SkipRecord as reason:
+                self.skipped[str(reason)] += 1
+        dates = [post.pub_date for post in posts]
+        with transaction.atomic():
+            watermark = Post.objects.aggregate(last=Max("pk"))["last"] or 0
+            Post.objects.bulk_create(posts)
+            # SQLite не возвращает id из bulk_create: перечитываем пачку
+            # в порядке вставки.
+            created = list(
+                Post.objects.filter(
+                    pk__gt=watermark,
+                    author_id__in={post.author_id for post in posts},
+                ).only("pk", "text", "author_id", "group_id", "pub_date")
+                .order_by("pk")
+            )
+            self.restore_pub_dates(created, dates)
+            per_author = Counter(post.author_id for post in posts)
+            for author_id, count in per_author.items():
+                counters.change_stats(author_id, "posts_count", count)
+            timeline.fan_out_many(created)
+            search.index_new_posts(created)
+            # Прогресс фиксируется вместе с пачкой: после обрыва она не
+            # повторится и не потеряется.
+            ImportProgress.objects.update_or_create(
+                source=self.source, defaults={"done": done}
+            )
+        paginators.change_count(["index"], len(created))
+        per_group = Counter(post.group_id for post in created if post.group_id)
+        for group_id, count in per_group.items():
+            paginators.change_count([f"group:{group_id}"], count)
+        for post in created:
+            self.touched.update(page_cache.scopes_of(post))
+        return len(posts)
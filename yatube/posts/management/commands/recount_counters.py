@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from posts import timeline
+from posts.counters import actual_stats_bulk
+from posts.models import AuthorStats, Post
+
+STATS_FIELDS = ("posts_count", "followers_count", "following_count")
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счётчики и чинит расхождения."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать расхождения, ничего не записывать.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        with transaction.atomic():
+            created, updated = self.repair_stats(batch_size)
+            posts = self.repair_comments(batch_size)
+            # Режим чтения на лету следует за исправленным числом
+            # подписчиков.
+            timeline.sync_modes()
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+        self.stdout.write(
+            f"Счётчики пользователей: создано {created}, "
+            f"исправлено {updated}; счётчики комментариев: "
+            f"исправлено {posts}."
+        )
+
+    def repair_stats(self, batch_size):
+        actual = actual_stats_bulk()
+        to_update = []
+        for stats in AuthorStats.objects.iterator():
+            values = actual.pop(stats.user_id, dict.fromkeys(STATS_FIELDS, 0))
+            if any(getattr(stats, f) != values[f] for f in STATS_FIELDS):
+                for field, value in values.items():
+                    setattr(stats, field, value)
+                to_update.append(stats)
+        AuthorStats.objects.bulk_update(
+            to_update, STATS_FIELDS, batch_size=batch_size
+        )
+        AuthorStats.objects.bulk_create(
+            (
+                AuthorStats(user_id=user_id, **values)
+                for user_id, values in actual.items()
+            ),
+            batch_size=batch_size,
+        )
+        return len(actual), len(to_update)
+
+    def repair_comments(self, batch_size):
+        drifted = [
+            Post(pk=pk, comments_count=total)
+            for pk, total in Post.objects.annotate(total=Count("comments"))
+            .filter(~Q(comments_count=F("total")))
+            .values_list("pk", "total")
+            .iterator()
+        ]
+        Post.objects.bulk_update(
+            drifted, ["comments_count"], batch_size=batch_size
+        )
+        return len(drifted)
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:18
+
+from django.db import migrations, models
+
+# posts.timeline.FANOUT_FOLLOWERS_LIMIT на момент миграции.
+FANOUT_FOLLOWERS_LIMIT = 1000
+
+
+def mark_prolific(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gt=FANOUT_FOLLOWERS_LIMIT
+    ).update(read_on_the_fly=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_image_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='read_on_the_fly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_prolific, migrations.RunPython.noop),
+    ]
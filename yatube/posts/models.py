@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
-from core.models import CreatedModel
+from core.models import AtomicSaveMixin, CreatedModel
 
 User = get_user_model()
 
@@ -19,7 +19,25 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Выборка для лент: автор и группа одним JOIN, без лишних колонок."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'image',
+            'image_width',
+            'image_height',
+            'comments_count',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__title',
+            'group__slug',
+        )
+
+
+class Post(AtomicSaveMixin, models.Model):
     text = models.TextField(verbose_name='Text',
                             help_text='Напишите текст для своего поста')
     pub_date = models.DateTimeField(
@@ -49,6 +67,20 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Размеры записываются PostForm при загрузке, без открытия файла.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Comments count',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self) -> str:
         return (self.text)[:15]
@@ -57,9 +89,17 @@ class Post(models.Model):
         ordering = ['-pub_date', ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты автора и группы: отбор по ключу и порядок по дате без
+        # сортировки (id в SQLite и так хранится в конце индекса).
+        indexes = [
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date'),
+        ]
 
 
-class Comment(CreatedModel):
+class Comment(AtomicSaveMixin, CreatedModel):
     text = models.TextField(verbose_name='Text',
                             help_text='Напишите текст')
     author = models.ForeignKey(
@@ -79,8 +119,14 @@ class Comment(CreatedModel):
         help_text='Укажите пост, к которой будет принадлежать',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created'),
+        ]
+
 
-class Follow(models.Model):
+class Follow(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -97,3 +143,76 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique follow')
         ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique timeline entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timeline_user_feed'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам, а читаются на лету
+    # (см. posts.timeline.update_mode).
+    read_on_the_fly = models.BooleanField(default=False)
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.posts_count}'
+
+
+class SearchTerm(models.Model):
+    """Запись инвертированного индекса: основа слова в посте и её вес."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'post'],
+                                    name='unique search term')
+        ]
+
+
+class ImportProgress(models.Model):
+    """Сколько записей файла уже импортировано командой import_posts.
+    Пишется в транзакции пачки, поэтому после обрыва не расходится
+    с тем, что попало в базу."""
+    source = models.CharField(max_length=255, unique=True)
+    done = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.source}: {self.done}'
@@ -0,0 +1,131 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from core import replicas
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from .models import Group, Post, User
+
+PAGE_TIMEOUT: int = 60 * 10
+STAMP_KEY = "page_stamp:{}"
+
+
+def scopes_of(post):
+    """Области страниц, где виден пост: главная, страница поста, профиль
+    автора и группа."""
+    scopes = ["index", f"post:{post.pk}", f"author:{post.author_id}"]
+    if post.group_id is not None:
+        scopes.append(f"group:{post.group_id}")
+    return scopes
+
+
+def scopes_of_id(post_id):
+    """scopes_of по id; для удалённого поста — главная и его страница."""
+    post = Post.objects.filter(pk=post_id).only("author_id", "group_id")
+    return scopes_of(post[0]) if post else ["index", f"post:{post_id}"]
+
+
+def _set_stamps(keys):
+    cache.set_many(dict.fromkeys(keys, time.time()), None)
+
+
+def touch(scopes):
+    """Отмечает изменение страниц областей scopes. Как и версии
+    карточек, отметки ставятся ещё раз после фиксации транзакции, чтобы
+    страница, собранная до неё, не закешировалась под новой отметкой."""
+    keys = [STAMP_KEY.format(scope) for scope in set(scopes)]
+    _set_stamps(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _set_stamps(keys))
+
+
+def changed_at(scopes):
+    """Время последнего изменения областей scopes."""
+    keys = [STAMP_KEY.format(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            # Отметка потерялась вместе с кешем: считаем, что всё
+            # изменилось.
+            stamps[key] = time.time()
+            cache.add(key, stamps[key], None)
+    return datetime.fromtimestamp(max(stamps.values()), timezone.utc)
+
+
+def index_scope(request):
+    return ["index"]
+
+
+def group_scope(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list("pk", flat=True).first()
+    )
+    return [f"group:{group_id}"]
+
+
+def profile_scope(request, username):
+    user_id = (
+        User.objects.filter(username=username)
+        .values_list("pk", flat=True).first()
+    )
+    return [f"author:{user_id}"]
+
+
+def post_scope(request, post_id):
+    # Страница поста показывает счётчики автора и название группы.
+    post = Post.objects.filter(pk=post_id).values(
+        "author_id", "group_id"
+    ).first() or {}
+    return [
+        f"post:{post_id}",
+        f"author:{post.get('author_id')}",
+        f"group:{post.get('group_id')}",
+    ]
+
+
+def public_page(scopes):
+    """Кеширует страницу целиком для анонимов и отвечает 304 по
+    ETag/Last-Modified. scopes(request, *args, **kwargs) возвращает
+    области, от которых зависит страница; их меняет touch(). Страница,
+    собранная по реплике, отстающей от этих изменений, не кешируется и
+    уходит без валидаторов."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+            ):
+                return view(request, *args, **kwargs)
+            last_modified = changed_at(scopes(request, *args, **kwargs))
+            if replicas.lagging(last_modified.timestamp()):
+                return view(request, *args, **kwargs)
+            timestamp = int(last_modified.timestamp())
+            etag = quote_etag(hashlib.md5(
+                f"{request.get_full_path()}:{last_modified.isoformat()}"
+                .encode()
+            ).hexdigest())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                key = f"public_page:{etag}"
+                response = cache.get(key)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.cookies:
+                        cache.set(key, response, PAGE_TIMEOUT)
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(timestamp)
+                patch_cache_control(response, max_age=0, must_revalidate=True)
+                patch_vary_headers(response, ("Cookie",))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,235 @@
+import base64
+import binascii
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+NEXT = "n"
+PREVIOUS = "p"
+
+COUNT_TIMEOUT: int = 60 * 60
+# Выше этого числа записей счётчик ленты не пересчитывается при каждой
+# публикации, а сдвигается на ±1 и уточняется по истечении COUNT_TIMEOUT.
+ESTIMATE_THRESHOLD: int = 10000
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_WINDOW: int = 2
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, values], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора; для мусора возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу (seek) вместо OFFSET.
+
+    Страница выбирается условием по упорядочивающим полям последней
+    показанной записи, поэтому её стоимость не зависит от глубины.
+    Возвращается обычный ``Page``: has_next/has_previous работают как
+    прежде, но номер страницы условный — для ссылок служат курсоры
+    ``page.next_cursor`` и ``page.previous_cursor``.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id")):
+        self.ordering = tuple(ordering)
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+        self.num_pages = 1
+
+    def _fields(self):
+        return [name.lstrip("-") for name in self.ordering]
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[name] for name in self._fields()]
+        return [getattr(obj, name) for name in self._fields()]
+
+    def _field(self, name):
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def _parse(self, values):
+        return [
+            self._field(name).to_python(value)
+            for name, value in zip(self._fields(), values)
+        ]
+
+    def _seek(self, values, forward):
+        """Условие «строго после ключа» в порядке ordering (или до него)."""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip("-")
+            descending = name.startswith("-")
+            lookup = "lt" if descending == forward else "gt"
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_page(self, cursor):
+        """Возвращает страницу по токену курсора; мусор ведёт на первую."""
+        decoded = decode_cursor(cursor)
+        if decoded is None or len(decoded[1]) != len(self.ordering):
+            return self.page(None)
+        direction, values = decoded
+        try:
+            values = self._parse(values)
+        except (ValidationError, ValueError, TypeError):
+            return self.page(None)
+        return self.page((direction, values))
+
+    def page(self, position):
+        queryset = self.object_list
+        if position is None:
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = False
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        elif position[0] == NEXT:
+            queryset = queryset.filter(self._seek(position[1], True))
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = True
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        else:
+            queryset = queryset.filter(self._seek(position[1], False))
+            rows = list(queryset.reverse()[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            has_next = True
+            rows = rows[:self.per_page][::-1]
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            encode_cursor(NEXT, self._key(rows[-1]))
+            if has_next and rows else None
+        )
+        page.previous_cursor = (
+            encode_cursor(PREVIOUS, self._key(rows[0]))
+            if has_previous and rows else None
+        )
+        return page
+
+
+def _count_key(scope):
+    return f"feed_count:{scope}"
+
+
+def change_count(scopes, delta):
+    """Учитывает появление (delta > 0) или удаление постов в лентах.
+
+    Точный счётчик небольшой ленты сбрасывается и пересчитается при
+    чтении, оценка большой — атомарно сдвигается на delta (cache.incr),
+    чтобы одновременные публикации не затирали друг друга.
+    """
+    keys = [_count_key(scope) for scope in scopes]
+    counts = cache.get_many(keys)
+    stale = []
+    for key in keys:
+        if counts.get(key, 0) < ESTIMATE_THRESHOLD:
+            stale.append(key)
+            continue
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Счётчик истёк между чтением и сдвигом — пересчитается.
+            pass
+    cache.delete_many(stale)
+
+
+def forget_count(scopes):
+    """Сбрасывает счётчики лент, чьё содержимое изменилось целиком."""
+    cache.delete_many([_count_key(scope) for scope in scopes])
+
+
+class CountingPaginator(Paginator):
+    """Нумерованные страницы без COUNT(*) на каждый запрос.
+
+    Число записей берётся из known_count (если его уже ведут, как
+    счётчик постов автора) или из кеша по ключу ленты scope; без scope
+    считается как обычно. Страница получает ``window`` — номера вокруг
+    текущей с первой и последней, пропуски обозначены None.
+    """
+
+    keyset = False
+
+    def __init__(self, object_list, per_page, scope=None, known_count=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+        self.known_count = known_count
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if self.scope is None:
+            return super().count
+        key = _count_key(self.scope)
+        value = cache.get(key)
+        if value is None:
+            value = self.object_list.count()
+            cache.set(key, value, COUNT_TIMEOUT)
+        return value
+
+    def window(self, number):
+        last = self.num_pages
+        numbers = sorted({
+            1, last,
+            *range(max(1, number - PAGE_WINDOW),
+                   min(last, number + PAGE_WINDOW) + 1),
+        })
+        result = []
+        for current in numbers:
+            if result and current - result[-1] > 1:
+                result.append(None)
+            result.append(current)
+        return result
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.window = self.window(page.number)
+        return page
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки больших таблиц.
+
+    Полный список считается раз в COUNT_TIMEOUT, отфильтрованный — не
+    дальше ESTIMATE_THRESHOLD записей: за этим порогом число страниц
+    оценочное, и сузить выборку предлагается фильтром.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return queryset.order_by()[:ESTIMATE_THRESHOLD + 1].count()
+        key = f"admin_count:{queryset.model._meta.label_lower}"
+        value = cache.get(key)
+        if value is None:
+            value = queryset.count()
+            cache.set(key, value, COUNT_TIMEOUT)
+        return value
@@ -0,0 +1,250 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Инвертированный индекс хранится в SearchTerm: основа слова, пост и вес —
+сколько раз основа встречается в тексте поста (с весом TEXT_WEIGHT) и в
+комментариях к нему (COMMENT_WEIGHT). Основы получаются стеммером Портера
+для русского языка (алгоритм Snowball), латиница только приводится к
+нижнему регистру.
+"""
+import re
+from collections import Counter
+from itertools import groupby
+
+from django.db.models import Count, F, Sum
+
+from .models import Comment, Post, SearchTerm
+
+TEXT_WEIGHT: int = 3
+COMMENT_WEIGHT: int = 1
+TERM_MAX_LENGTH: int = 64
+
+STOP_WORDS = frozenset(
+    "а без бы в во вот вы да для до его ее ей ему если еще же за и из или "
+    "им их к как ко ли мне мы на над не нет ни но о об он она они оно от "
+    "по под при с со так там то только ты у уже что это я".split()
+)
+
+_WORD = re.compile(r"\w+")
+_CYRILLIC = re.compile(r"[а-я]")
+
+_VOWELS = "аеиоуыэюя"
+_GERUND = ("в", "вши", "вшись")
+_GERUND_ALONE = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+_ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем",
+    "им", "ым", "ом", "его", "ого", "ему", "ому", "их", "ых", "ую", "юю",
+    "ая", "яя", "ою", "ею",
+)
+_PARTICIPLE = ("ем", "нн", "вш", "ющ", "щ")
+_PARTICIPLE_ALONE = ("ивш", "ывш", "ующ")
+_REFLEXIVE = ("ся", "сь")
+_VERB = (
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет",
+    "ют", "ны", "ть", "ешь", "нно",
+)
+_VERB_ALONE = (
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй",
+    "ил", "ыл", "им", "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют",
+    "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+)
+_NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии",
+    "и", "ией", "ей", "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам",
+    "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия",
+    "ья", "я",
+)
+_SUPERLATIVE = ("ейш", "ейше")
+_DERIVATIONAL = ("ост", "ость")
+
+
+def _region(word, start):
+    """Начало области после первой пары «гласная + согласная»."""
+    for i in range(start + 1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _cut(word, start, endings, after_a=()):
+    """Отрезает самое длинное окончание, целиком лежащее в word[start:].
+
+    Окончания из after_a отрезаются, только если перед ними «а» или «я».
+    Если подходящего окончания нет, возвращает None.
+    """
+    region = word[start:]
+    ending = max(
+        (e for e in endings + after_a if region.endswith(e)),
+        key=len, default=None,
+    )
+    if ending is None:
+        return None
+    rest = region[:-len(ending)]
+    if ending not in endings and not rest.endswith(("а", "я")):
+        return None
+    return word[:-len(ending)]
+
+
+def _adjectival(word, start):
+    stem = _cut(word, start, _ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _cut(stem, start, _PARTICIPLE_ALONE, _PARTICIPLE)
+    return stem if participle is None else participle
+
+
+def _inflection(word, rv):
+    """Шаг 1: деепричастие, либо возвратная частица и затем
+    прилагательное, глагол или существительное."""
+    gerund = _cut(word, rv, _GERUND_ALONE, _GERUND)
+    if gerund is not None:
+        return gerund
+    word = _cut(word, rv, _REFLEXIVE) or word
+    for result in (
+        _adjectival(word, rv),
+        _cut(word, rv, _VERB_ALONE, _VERB),
+        _cut(word, rv, _NOUN),
+    ):
+        if result is not None:
+            return result
+    return word
+
+
+def _tidy_up(word, rv):
+    """Шаг 4: превосходная степень, двойное «н» и мягкий знак."""
+    superlative = _cut(word, rv, _SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word[rv:].endswith("нн"):
+        return word[:-1]
+    if superlative is None and word[rv:].endswith("ь"):
+        return word[:-1]
+    return word
+
+
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка."""
+    word = word.lower().replace("ё", "е")
+    if not _CYRILLIC.search(word):
+        return word
+    rv = next(
+        (i + 1 for i, char in enumerate(word) if char in _VOWELS), len(word)
+    )
+    r2 = _region(word, _region(word, 0))
+    word = _inflection(word, rv)
+    if word[rv:].endswith("и"):
+        word = word[:-1]
+    word = _cut(word, max(r2, rv), _DERIVATIONAL) or word
+    return _tidy_up(word, rv)
+
+
+def terms(text):
+    """Основы значимых слов текста по порядку, с повторами."""
+    for word in _WORD.findall(text.lower().replace("ё", "е")):
+        if word in STOP_WORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        yield stem(word)[:TERM_MAX_LENGTH]
+
+
+def post_weights(text, comments=()):
+    """Веса основ для поста с текстом text и комментариями comments."""
+    weights = Counter()
+    for term in terms(text):
+        weights[term] += TEXT_WEIGHT
+    for comment in comments:
+        for term in terms(comment):
+            weights[term] += COMMENT_WEIGHT
+    return weights
+
+
+def index_post(post_id):
+    """Полностью пересобирает записи индекса для поста."""
+    post = Post.objects.filter(pk=post_id).only("text").first()
+    SearchTerm.objects.filter(post_id=post_id).delete()
+    if post is None:
+        return
+    comments = Comment.objects.filter(post_id=post_id).values_list(
+        "text", flat=True
+    )
+    SearchTerm.objects.bulk_create(
+        SearchTerm(post_id=post_id, term=term, weight=weight)
+        for term, weight in post_weights(post.text, comments).items()
+    )
+
+
+def index_new_posts(posts):
+    """Индексирует пачку только что созданных постов без комментариев."""
+    SearchTerm.objects.bulk_create(
+        (
+            SearchTerm(post_id=post.pk, term=term, weight=weight)
+            for post in posts
+            for term, weight in post_weights(post.text).items()
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def _change_weights(post_id, weights, sign):
+    entries = SearchTerm.objects.filter(post_id=post_id)
+    by_weight = sorted(weights.items(), key=lambda item: item[1])
+    for weight, group in groupby(by_weight, key=lambda item: item[1]):
+        group = [term for term, _ in group]
+        if sign < 0:
+            # Сначала убираем записи, вес которых уходит в ноль.
+            entries.filter(term__in=group, weight__lte=weight).delete()
+        entries.filter(term__in=group).update(
+            weight=F("weight") + sign * weight
+        )
+    if sign > 0:
+        existing = set(
+            entries.filter(term__in=weights).values_list("term", flat=True)
+        )
+        SearchTerm.objects.bulk_create(
+            (
+                SearchTerm(post_id=post_id, term=term, weight=weight)
+                for term, weight in weights.items() if term not in existing
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def add_comment(comment):
+    """Добавляет слова нового комментария к весам поста."""
+    if comment.post_id is not None:
+        weights = post_weights("", (comment.text,))
+        _change_weights(comment.post_id, weights, 1)
+
+
+def remove_comment(comment):
+    """Вычитает слова удалённого комментария из весов поста."""
+    if comment.post_id is not None:
+        weights = post_weights("", (comment.text,))
+        _change_weights(comment.post_id, weights, -1)
+
+
+def matching_post_ids(query):
+    """Подзапрос id постов, где встречаются все слова запроса."""
+    wanted = set(terms(query))
+    return (
+        SearchTerm.objects.filter(term__in=wanted)
+        .values("post_id")
+        .annotate(matched=Count("id"))
+        .filter(matched=len(wanted))
+        .values("post_id")
+    )
+
+
+def search_posts(query):
+    """Посты, где встречаются все слова запроса, по убыванию веса."""
+    wanted = set(terms(query))
+    if not wanted:
+        return Post.objects.none()
+    return (
+        Post.objects.for_feed()
+        .filter(search_terms__term__in=wanted)
+        .annotate(
+            rank=Sum("search_terms__weight"),
+            matched=Count("search_terms"),
+        )
+        .filter(matched=len(wanted))
+        .order_by("-rank", "-pub_date", "-id")
+    )
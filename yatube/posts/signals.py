@@ -0,0 +1,126 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cards, counters, page_cache, paginators, tasks, timeline
+from .models import Comment, Follow, Group, Post
+
+
+def feed_scopes(post):
+    """Ленты с кешированным числом постов, куда попадает пост. Ленты
+    подписок при публикации учитывает timeline.fan_out_many, при
+    удалении — post_deleted."""
+    scopes = ["index"]
+    if post.group_id is not None:
+        scopes.append(f"group:{post.group_id}")
+    return scopes
+
+
+def follow_scopes(follow):
+    """Профили с изменившимися счётчиками подписок."""
+    return [f"author:{follow.author_id}", f"author:{follow.user_id}"]
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста: правка из формы или админки
+    может перенести его в другую."""
+    instance._old_group_id = None
+    if instance.pk is not None:
+        instance._old_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    scopes = page_cache.scopes_of(instance)
+    if created:
+        counters.change_stats(instance.author_id, "posts_count", 1)
+        paginators.change_count(feed_scopes(instance), 1)
+    else:
+        old_group_id = getattr(instance, "_old_group_id", None)
+        if old_group_id != instance.group_id:
+            if old_group_id is not None:
+                paginators.change_count([f"group:{old_group_id}"], -1)
+                scopes.append(f"group:{old_group_id}")
+            if instance.group_id is not None:
+                paginators.change_count([f"group:{instance.group_id}"], 1)
+    tasks.invalidate.delay(post_id=instance.pk, scopes=scopes)
+    tasks.index.delay(post_id=instance.pk)
+    if created:
+        tasks.fan_out.delay(post_id=instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_stats(instance.author_id, "posts_count", -1)
+    paginators.change_count(
+        feed_scopes(instance) + timeline.follower_scopes(instance.author_id),
+        -1,
+    )
+    tasks.invalidate.delay(
+        post_id=instance.pk, scopes=page_cache.scopes_of(instance)
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+        tasks.invalidate.delay(
+            post_id=instance.post_id,
+            scopes=page_cache.scopes_of_id(instance.post_id),
+        )
+        tasks.comment_search.delay(
+            post_id=instance.post_id, text=instance.text, sign=1
+        )
+        tasks.notify_comment.delay(comment_id=instance.pk)
+    else:
+        # Старый текст правленого комментария неизвестен: индекс поста
+        # пересобирается целиком.
+        tasks.invalidate.delay(
+            post_id=instance.post_id,
+            scopes=page_cache.scopes_of_id(instance.post_id),
+        )
+        tasks.index.delay(post_id=instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    tasks.invalidate.delay(
+        post_id=instance.post_id,
+        scopes=page_cache.scopes_of_id(instance.post_id),
+    )
+    tasks.comment_search.delay(
+        post_id=instance.post_id, text=instance.text, sign=-1
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cards.invalidate_group(instance.pk)
+    page_cache.touch(["index", f"group:{instance.pk}"])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_stats(instance.author_id, "followers_count", 1)
+        counters.change_stats(instance.user_id, "following_count", 1)
+        timeline.update_mode(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        paginators.forget_count([f"follow:{instance.user_id}"])
+        page_cache.touch(follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_stats(instance.author_id, "followers_count", -1)
+    counters.change_stats(instance.user_id, "following_count", -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.update_mode(instance.author_id)
+    paginators.forget_count([f"follow:{instance.user_id}"])
+    page_cache.touch(follow_scopes(instance))
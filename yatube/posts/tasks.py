@@ -0,0 +1,86 @@
+"""Фоновые задачи записи постов и комментариев (см. core/jobs.py).
+
+Счётчики остаются в обработчиках сигналов: они дешёвые, и по ним
+строятся страницы сразу после записи. Остальное ставится в очередь.
+"""
+from core import jobs
+from django.conf import settings
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from . import cards, page_cache, search, thumbnails, timeline
+from .models import Comment, Post
+
+
+def _post_ids(payloads):
+    return list(dict.fromkeys(payload["post_id"] for payload in payloads))
+
+
+@jobs.task("posts.invalidate", batch=True)
+def invalidate(payloads):
+    """Сбрасывает карточки постов и одним вызовом — кеш их страниц."""
+    for post_id in _post_ids(payloads):
+        cards.invalidate_post(post_id)
+    page_cache.touch(
+        {scope for payload in payloads for scope in payload.get("scopes", ())}
+    )
+
+
+@jobs.task("posts.index", batch=True)
+def index(payloads):
+    for post_id in _post_ids(payloads):
+        search.index_post(post_id)
+
+
+@jobs.task("posts.fan_out", batch=True)
+def fan_out(payloads):
+    timeline.fan_out_many(
+        Post.objects.filter(pk__in=_post_ids(payloads))
+        .only("pk", "author_id", "pub_date")
+    )
+
+
+@jobs.task("posts.resume_fan_out")
+def resume_fan_out(author_id):
+    timeline.resume_fan_out(author_id)
+
+
+@jobs.task("posts.comment_search")
+def comment_search(post_id, text, sign):
+    """Добавляет (sign=1) или вычитает слова комментария из индекса.
+    Текст передаётся в задаче: комментарий к этому времени может быть
+    уже удалён."""
+    comment = Comment(post_id=post_id, text=text)
+    if sign > 0:
+        search.add_comment(comment)
+    else:
+        search.remove_comment(comment)
+
+
+@jobs.task("posts.notify_comment")
+def notify_comment(comment_id):
+    """Письмо автору поста о новом комментарии."""
+    comment = (
+        Comment.objects.select_related("author", "post__author")
+        .filter(pk=comment_id).first()
+    )
+    if comment is None or comment.author_id == comment.post.author_id:
+        return
+    recipient = comment.post.author.email
+    if not recipient:
+        return
+    link = reverse("posts:post_detail", args=[comment.post_id])
+    send_mail(
+        f"Новый комментарий от {comment.author.username}",
+        f"{comment.text}\n\n{link}",
+        settings.DEFAULT_FROM_EMAIL,
+        [recipient],
+    )
+
+
+@jobs.task("posts.thumbnail")
+def thumbnail(post_id, image):
+    post = Post.objects.filter(pk=post_id).only("pk", "image").first()
+    # Изображение успели заменить — миниатюру сделает новая задача.
+    if post is not None and post.image.name == image:
+        thumbnails.generate(post_id, post.image)
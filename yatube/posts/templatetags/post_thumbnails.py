@@ -0,0 +1,22 @@
+from django import template
+
+from core import profiling
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Перед циклом по ленте загружает миниатюры всей страницы."""
+    with profiling.section("thumbnails"):
+        thumbnails.prefetch(posts)
+    return ""
+
+
+@register.inclusion_tag("posts/includes/picture.html")
+def feed_picture(post, lazy=False):
+    """<picture> с вариантами миниатюры поста. Недостающие варианты
+    ставятся в очередь, а страница рендерится без ожидания."""
+    with profiling.section("thumbnails"):
+        return {"picture": thumbnails.picture(post), "lazy": lazy}
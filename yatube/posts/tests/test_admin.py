@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            "moderator", "moderator@example.com", "password"
+        )
+        self.client.force_login(self.admin)
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def add_rows(self, count):
+        start = Post.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f"author{number}")
+            post = Post.objects.create(
+                text=f"Котики номер {number}", author=author, group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text="Да")
+            Follow.objects.create(user=self.admin, author=author)
+
+    def queries(self, name, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк."""
+        names = (
+            "admin:posts_post_changelist",
+            "admin:posts_comment_changelist",
+            "admin:posts_follow_changelist",
+        )
+        self.add_rows(1)
+        before = {name: self.queries(name) for name in names}
+        self.add_rows(5)
+        cache.clear()
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.queries(name), before[name])
+
+    def test_post_search_uses_index(self):
+        self.add_rows(2)
+        post = Post.objects.order_by("pk").first()
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "котиков"}
+        )
+        self.assertEqual(response.context["cl"].result_count, 2)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": str(post.pk)}
+        )
+        self.assertEqual(list(response.context["cl"].result_list), [post])
@@ -0,0 +1,265 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from PIL import Image
+from posts import benchmark, search
+from posts.models import (AuthorStats, Comment, Follow, Group, ImportProgress,
+                          Post, SearchTerm, TimelineEntry)
+
+User = get_user_model()
+
+
+class RecountCountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.post = Post.objects.create(author=self.author, text="Текст")
+        Comment.objects.create(author=self.reader, post=self.post, text="1")
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_recount_repairs_drift(self):
+        """Команда восстанавливает испорченные и пропавшие счётчики."""
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comments_count=0)
+
+        call_command("recount_counters", "--dry-run", stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 7
+        )
+
+        call_command("recount_counters", stdout=StringIO())
+        author = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 1)
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+class BenchmarkTest(TestCase):
+    def test_seed_and_measure(self):
+        """Наполнение строит производные данные, замеры покрывают
+        маршруты, а сравнение с эталоном находит регрессии."""
+        benchmark.seed(users=5, posts=30, follows=10, groups=2, comments=8)
+        self.assertEqual(Follow.objects.count(), 10)
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list("posts_count", flat=True)),
+            30,
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertTrue(SearchTerm.objects.exists())
+
+        results = benchmark.run(
+            repeat=2, only=("posts:index", "posts:follow_index")
+        )
+        self.assertEqual(set(results), {"posts:index", "posts:follow_index"})
+        self.assertTrue(results["posts:follow_index"]["user"])
+        for metrics in results.values():
+            self.assertEqual(metrics["status"], 200)
+        # Анонимная главная из кеша страниц обходится без запросов.
+        self.assertGreater(results["posts:follow_index"]["queries"], 0)
+
+        baseline = {
+            name: dict(metrics, queries=metrics["queries"] - 1)
+            for name, metrics in results.items()
+        }
+        self.assertEqual(benchmark.compare(results, results), [])
+        self.assertEqual(len(benchmark.compare(results, baseline)), 2)
+
+
+class ImportPostsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(
+            title="Группа", slug="imported", description="Описание"
+        )
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        cache.clear()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def test_import_jsonl(self):
+        """Посты создаются пачками с датами из файла, счётчиками, лентами
+        и индексом; плохие записи пропускаются."""
+        records = [
+            {"text": "Первый импорт", "author": "writer",
+             "group": "imported", "pub_date": "2020-01-02T03:04:05"},
+            {"text": "Второй импорт", "author": "writer"},
+            {"text": "Чужой", "author": "nobody"},
+            {"text": "", "author": "writer"},
+            {"text": "Третий импорт", "author": "reader",
+             "pub_date": "2021-05-06T07:08:09+00:00"},
+        ]
+        path = self.write(
+            "posts.jsonl", "\n".join(json.dumps(r) for r in records)
+        )
+        out = StringIO()
+        call_command("import_posts", path, "--batch-size", "2", stdout=out)
+        self.assertIn("добавлено 3 постов", out.getvalue())
+        self.assertFalse(ImportProgress.objects.exists())
+        first = Post.objects.get(text="Первый импорт")
+        self.assertEqual(first.group, self.group)
+        self.assertEqual(first.pub_date.year, 2020)
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertTrue(
+            SearchTerm.objects.filter(post=first, term="импорт").exists()
+        )
+
+    def test_import_shifts_feed_counts(self):
+        """Импорт сдвигает оценку числа постов большой ленты и сбрасывает
+        точный счётчик небольшой."""
+        cache.set("feed_count:index", 20000)
+        cache.set(f"feed_count:group:{self.group.pk}", 5)
+        path = self.write(
+            "posts.csv",
+            "text,author,group,pub_date\n"
+            "Один,writer,imported,\nДва,writer,,\n",
+        )
+        call_command("import_posts", path, stdout=StringIO())
+        self.assertEqual(cache.get("feed_count:index"), 20002)
+        self.assertIsNone(cache.get(f"feed_count:group:{self.group.pk}"))
+
+    def test_imported_images_processed(self):
+        """Внешняя картинка обрабатывается, как загрузка из формы, у
+        картинки из хранилища запоминаются размеры."""
+        media = os.path.join(self.directory, "media")
+        os.makedirs(os.path.join(media, "posts"))
+        Image.new("RGB", (30, 20)).save(os.path.join(media, "posts/old.png"))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°.
+        photo = os.path.join(self.directory, "photo.jpg")
+        Image.new("RGB", (3000, 1500), "red").save(photo, exif=exif)
+        path = self.write(
+            "posts.csv",
+            "text,author,image\n"
+            f"Фото,writer,{photo}\nСтарое,writer,posts/old.png\n",
+        )
+        with self.settings(MEDIA_ROOT=media):
+            call_command("import_posts", path, stdout=StringIO())
+            post = Post.objects.get(text="Фото")
+            self.assertEqual(post.image.name, "posts/photo.webp")
+            self.assertEqual(
+                (post.image_width, post.image_height), (1024, 2048)
+            )
+            with Image.open(post.image.path) as stored:
+                self.assertEqual(stored.size, (1024, 2048))
+                self.assertFalse(stored.getexif())
+        self.assertEqual(
+            Post.objects.filter(text="Старое")
+            .values_list("image", "image_width", "image_height").get(),
+            ("posts/old.png", 30, 20),
+        )
+
+    def test_resume_from_saved_progress(self):
+        """После обрыва импорт продолжается с сохранённой записи."""
+        path = self.write(
+            "posts.csv",
+            "text,author,group,pub_date\n"
+            "Один,writer,,\nДва,writer,,\nТри,writer,imported,\n",
+        )
+        ImportProgress.objects.create(source=os.path.abspath(path), done=2)
+        call_command("import_posts", path, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.values_list("text", flat=True)), ["Три"]
+        )
+        self.assertFalse(ImportProgress.objects.exists())
+
+    def test_failed_batch_not_repeated(self):
+        """Прогресс фиксируется вместе с пачкой: упавшая пачка
+        откатывается целиком, а уже принятые не импортируются повторно."""
+        path = self.write(
+            "posts.csv",
+            "text,author,group,pub_date\n"
+            "Один,writer,,2020-01-01T00:00:00\nДва,writer,,\nТри,writer,,\n",
+        )
+        index = search.index_new_posts
+        with mock.patch.object(
+            search, "index_new_posts",
+            side_effect=[None, RuntimeError("обрыв")],
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "import_posts", path, "--batch-size", "2",
+                    stdout=StringIO(),
+                )
+        self.assertEqual(ImportProgress.objects.get().done, 2)
+        with mock.patch.object(search, "index_new_posts", index):
+            call_command(
+                "import_posts", path, "--batch-size", "2", stdout=StringIO()
+            )
+        self.assertEqual(
+            list(Post.objects.order_by("pk").values_list("text", flat=True)),
+            ["Один", "Два", "Три"],
+        )
+        self.assertEqual(Post.objects.get(text="Один").pub_date.year, 2020)
+        self.assertTrue(Post._meta.get_field("pub_date").auto_now_add)
+
+
+class ExportDataTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.old = Post.objects.create(text="Старый", author=self.author)
+        Post.objects.filter(pk=self.old.pk).update(
+            pub_date=datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+        self.new = Post.objects.create(text="Новый", author=self.author)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_export_jsonl_since(self):
+        """Инкрементная выгрузка берёт только записи после отметки."""
+        out = StringIO()
+        call_command(
+            "export_data", "posts", "--since", "2021-01-01",
+            stdout=out, stderr=StringIO(),
+        )
+        [line] = out.getvalue().splitlines()
+        record = json.loads(line)
+        self.assertEqual(
+            (record["id"], record["author_username"]),
+            (self.new.pk, "writer"),
+        )
+
+    def test_export_csv_gzip(self):
+        """CSV со сжатием пишется в файл и читается обратно."""
+        path = os.path.join(self.directory, "posts.csv.gz")
+        err = StringIO()
+        call_command(
+            "export_data", "posts", "--format", "csv", "--gzip",
+            "--output", path, stderr=err,
+        )
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            records = list(csv.DictReader(file))
+        self.assertEqual(
+            [r["text"] for r in records], ["Старый", "Новый"]
+        )
+        self.assertIn(f"--after-id {self.new.pk}", err.getvalue())
@@ -1,12 +1,14 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.forms import PostForm
 from posts.models import Group, Post, Comment
 
@@ -89,13 +91,40 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertTrue(
             Post.objects.filter(
-                text="Test text", image="posts/small.gif").exists()
+                text="Test text", image="posts/small.webp",
+                image_width=2, image_height=1,
+            ).exists()
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         new_post = Post.objects.first()
         self.assertEqual(new_post.author, self.user)
         self.assertEqual(new_post.group, self.group)
 
+    def test_large_image_processed_at_ingest(self):
+        """Картинка уменьшается, поворачивается по EXIF и сохраняется
+        в WebP без метаданных."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°.
+        exif[0x010F] = "Камера"
+        buffer = BytesIO()
+        Image.new("RGB", (3000, 1500), "red").save(
+            buffer, "JPEG", exif=exif
+        )
+        uploaded = SimpleUploadedFile(
+            "photo.jpg", buffer.getvalue(), content_type="image/jpeg"
+        )
+        self.authorized_client.post(
+            reverse("posts:post_create"),
+            data={"text": "Фото", "image": uploaded},
+        )
+        post = Post.objects.get(text="Фото")
+        self.assertEqual(post.image.name, "posts/photo.webp")
+        self.assertEqual((post.image_width, post.image_height), (1024, 2048))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, "WEBP")
+            self.assertEqual(stored.size, (1024, 2048))
+            self.assertFalse(stored.getexif())
+
     def test_post_edit(self):
         """Валидная форма редактирует запись в Post"""
         self.post = Post.objects.create(
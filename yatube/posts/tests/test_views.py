@@ -1,22 +1,32 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core import mail
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Follow, Group, Post
+from core import jobs
+from core.models import Job
+from posts import (api, cards, counters, paginators, search, thumbnails,
+                   timeline, views)
+from posts.models import (Comment, Follow, Group, Post, SearchTerm,
+                          TimelineEntry)
 
 User = get_user_model()
 
 
 class PostPagesTests(TestCase):
-    @classmethod
     def setUp(self):
-        super().setUpClass()
+        super().setUp()
         self.guest_client = Client()
         self.user = User.objects.create_user(username="testuser")
         self.authorized_client = Client()
@@ -157,16 +167,26 @@ class PostPagesTests(TestCase):
                 self.assertNotIn(expected, form_field)
 
     def test_cache(self):
-        """Проверка кеширования главной страницы."""
+        """Карточки постов кешируются и сбрасываются при изменении."""
         response = self.guest_client.get(reverse("posts:index"))
-        Post.objects.get(id=1).delete()
-        # Удаляем пост, кешированием содержание дожно остаться одинаковым
-        response_2 = self.guest_client.get(reverse("posts:index"))
-        self.assertEqual(response.content, response_2.content)
-        """Проверка сброса кеша"""
-        cache.clear()
-        response_2_clear = self.guest_client.get(reverse("posts:index"))
-        self.assertNotEqual(response.content, response_2_clear.content)
+        self.assertContains(response, "Test text")
+        # Обновление в обход сигналов не видно: карточка взята из кеша
+        Post.objects.filter(pk=self.post.pk).update(text="Changed text")
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, "Test text")
+        # Сохранение модели сбрасывает карточку, и её видят все ленты
+        self.post.refresh_from_db()
+        self.post.save()
+        for url in (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), "Changed text")
+        # Удалённый пост сразу пропадает из ленты
+        self.post.delete()
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertNotContains(response, "Changed text")
 
     def test_follow_and_unfollow(self):
         """Проверка, что подписок нет."""
@@ -227,6 +247,707 @@ class PostPagesTests(TestCase):
         )
 
 
+class PaginatorViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="paginator")
+        self.group = Group.objects.create(
+            title="testgroup", slug="testgroup", description="Test description"
+        )
+        Post.objects.bulk_create(
+            Post(text=f"Пост {i}", author=self.user, group=self.group)
+            for i in range(13)
+        )
+        self.urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": self.user}),
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        expected = list(Post.objects.order_by("-pub_date", "-id"))
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context["page_obj"]
+                self.assertEqual(list(first), expected[:10])
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    url, {"cursor": first.next_cursor}
+                ).context["page_obj"]
+                self.assertEqual(list(second), expected[10:])
+                self.assertFalse(second.has_next())
+                back = self.client.get(
+                    url, {"cursor": second.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(list(back), expected[:10])
+                self.assertFalse(back.has_previous())
+
+    def test_bad_cursor_and_page_number(self):
+        """Мусорный курсор даёт первую страницу, ?page= работает как раньше."""
+        url = reverse("posts:profile", kwargs={"username": self.user})
+        response = self.client.get(url, {"cursor": "garbage"})
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(response.context["page_obj"].number, 2)
+        self.assertEqual(len(response.context["page_obj"]), 3)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            page = self.client.get(url, {"page": 1}).context["page_obj"]
+        counts = [q for q in captured if "COUNT(" in q["sql"]]
+        return page.paginator.count, len(counts)
+
+    def test_numbered_counts_cached(self):
+        """Число постов ленты считается один раз и сбрасывается при
+        публикации и удалении; у профиля берётся из счётчика автора."""
+        index, group, profile = self.urls
+        # Вошедший пользователь минует кеш страниц целиком.
+        self.client.force_login(self.user)
+        counters.recount_user(self.user.pk)
+        for url in (index, group):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), (13, 1))
+                self.assertEqual(self.count_queries(url), (13, 0))
+        self.assertEqual(self.count_queries(profile), (13, 0))
+        post = Post.objects.create(
+            text="Новый", author=self.user, group=self.group
+        )
+        self.assertEqual(self.count_queries(group), (14, 1))
+        post.delete()
+        self.assertEqual(self.count_queries(index), (13, 1))
+
+    def test_large_counts_estimated(self):
+        """Большая лента не пересчитывается, а сдвигает оценку."""
+        url = self.urls[0]
+        self.client.force_login(self.user)
+        with mock.patch.object(paginators, "ESTIMATE_THRESHOLD", 10):
+            self.assertEqual(self.count_queries(url), (13, 1))
+            Post.objects.create(text="Новый", author=self.user)
+            self.assertEqual(self.count_queries(url), (14, 0))
+
+    def test_counts_follow_post_changes(self):
+        """Удаление поста сдвигает ленты подписчиков автора, перенос в
+        другую группу вне формы (как из админки) — счётчики групп."""
+        reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=reader, author=self.user)
+        other = Group.objects.create(title="other", slug="other")
+        post = Post.objects.create(text="Без группы", author=self.user)
+        keys = (
+            f"feed_count:follow:{reader.pk}",
+            f"feed_count:group:{self.group.pk}",
+            f"feed_count:group:{other.pk}",
+        )
+        with mock.patch.object(paginators, "ESTIMATE_THRESHOLD", 10):
+            cache.set_many(dict.fromkeys(keys, 20))
+            post.group = self.group
+            post.save()
+            self.assertEqual([cache.get(key) for key in keys],
+                             [20, 21, 20])
+            post.group = other
+            post.save()
+            self.assertEqual([cache.get(key) for key in keys],
+                             [20, 20, 21])
+            post.delete()
+            self.assertEqual([cache.get(key) for key in keys],
+                             [19, 20, 20])
+
+    def test_page_window(self):
+        """Показываются соседние номера, первая и последняя страницы."""
+        paginator = paginators.CountingPaginator(range(100), 1)
+        self.assertEqual(
+            paginator.get_page(50).window,
+            [1, None, 48, 49, 50, 51, 52, None, 100],
+        )
+        self.assertEqual(paginator.get_page(2).window, [1, 2, 3, 4, None, 100])
+        Post.objects.bulk_create(
+            Post(text="Ещё", author=self.user) for _ in range(100)
+        )
+        response = self.client.get(self.urls[0], {"page": 6})
+        self.assertContains(response, "page=8")
+        self.assertNotContains(response, "page=9\"")
+        self.assertContains(response, "page=12")
+
+
+class FeedQueryBudgetTest(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+
+    # Сессия и пользователь (2) плюс запросы самой страницы.
+    BUDGETS = {
+        "posts:index": 2 + 1,
+        "posts:group_list": 2 + 2,
+        "posts:profile": 2 + 3,
+        "posts:follow_index": 2 + 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(
+            title="testgroup", slug="testgroup", description="Test description"
+        )
+        self.author = User.objects.create_user(
+            username="writer", first_name="Лев", last_name="Толстой"
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def urls(self):
+        return {
+            "posts:index": reverse("posts:index"),
+            "posts:group_list": reverse(
+                "posts:group_list", kwargs={"slug": self.group.slug}
+            ),
+            "posts:profile": reverse(
+                "posts:profile", kwargs={"username": self.author.username}
+            ),
+            "posts:follow_index": reverse("posts:follow_index"),
+        }
+
+    def test_feed_query_budget(self):
+        """Лента из одного и из десяти постов укладывается в бюджет."""
+        for posts_count in (1, 10):
+            for _ in range(posts_count - Post.objects.count()):
+                Post.objects.create(
+                    text="Текст", author=self.author, group=self.group
+                )
+            for name, url in self.urls().items():
+                with self.subTest(name=name, posts=posts_count):
+                    cache.clear()
+                    with self.assertNumQueries(self.BUDGETS[name]):
+                        response = self.client.get(url)
+                    self.assertEqual(
+                        len(response.context["page_obj"]), posts_count
+                    )
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц идут по индексам и не сортируют во временном
+    B-дереве. Поиск не проверяется: ранжирование требует сортировки."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="writer")
+        self.group = Group.objects.create(
+            title="testgroup", slug="testgroup", description="Test description"
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        for _ in range(max(views.POSTS_PER_PAGE, api.POSTS_PER_PAGE) + 1):
+            self.post = Post.objects.create(
+                text="Текст", author=self.author, group=self.group
+            )
+        Comment.objects.create(post=self.post, author=self.reader, text="Да")
+
+    def tearDown(self):
+        cache.clear()
+
+    def urls(self):
+        post = {"post_id": self.post.pk}
+        return [
+            reverse("posts:index"),
+            reverse("posts:group_list", kwargs={"slug": self.group.slug}),
+            reverse("posts:profile", kwargs={"username": "writer"}),
+            reverse("posts:follow_index"),
+            reverse("posts:post_detail", kwargs=post),
+            reverse("posts:post_comments", kwargs=post),
+            reverse("posts:api_index"),
+            reverse("posts:api_group_list", args=(self.group.slug,)),
+            reverse("posts:api_profile", args=("writer",)),
+            reverse("posts:api_follow_index"),
+            reverse("posts:api_post_detail", kwargs=post),
+        ]
+
+    def plans(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        for query in captured:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                yield query["sql"], [row[-1] for row in cursor.fetchall()]
+        self.next_url = None
+        page = response.context and response.context.get("page_obj")
+        if page is not None and getattr(page, "next_cursor", None):
+            self.next_url = f"{url}?cursor={page.next_cursor}"
+        elif response["Content-Type"].startswith("application/json"):
+            cursor = response.json().get("next")
+            if cursor:
+                self.next_url = f"{url}?cursor={cursor}"
+
+    def assertIndexed(self, url):
+        for sql, plan in self.plans(url):
+            for step in plan:
+                with self.subTest(url=url, step=step, sql=sql):
+                    self.assertNotIn("TEMP B-TREE", step)
+                    if step.startswith("SCAN"):
+                        self.assertIn("USING", step)
+
+    def test_feeds_use_indexes(self):
+        for login in (False, True):
+            if login:
+                self.client.force_login(self.reader)
+            for url in self.urls():
+                cache.clear()
+                self.assertIndexed(url)
+                if self.next_url:
+                    self.assertIndexed(self.next_url)
+
+    def test_prolific_follow_uses_indexes(self):
+        star = User.objects.create_user(username="star")
+        with mock.patch.object(timeline, "FANOUT_FOLLOWERS_LIMIT", 0):
+            Follow.objects.create(user=self.reader, author=star)
+        self.assertTrue(timeline.is_prolific(star.pk))
+        for _ in range(views.POSTS_PER_PAGE):
+            Post.objects.create(text="Звезда", author=star)
+        expected = list(
+            Post.objects.filter(author__in=[self.author, star])
+            .order_by("-pub_date", "-id").values_list("pk", flat=True)
+        )
+        self.client.force_login(self.reader)
+        for url in (
+            reverse("posts:follow_index"), reverse("posts:api_follow_index")
+        ):
+            cache.clear()
+            self.assertIndexed(url)
+            self.assertIsNotNone(self.next_url)
+            self.assertIndexed(self.next_url)
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertEqual(
+            [post.pk for post in response.context["page_obj"]],
+            expected[:views.POSTS_PER_PAGE],
+        )
+
+
+class PublicPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="Текст", author=self.user)
+        # Адрес и число запросов для проверки свежести кеша.
+        self.urls = (
+            (reverse("posts:index"), 0),
+            (reverse("posts:profile", kwargs={"username": self.user}), 1),
+            (
+                reverse("posts:post_detail", kwargs={"post_id": self.post.pk}),
+                1,
+            ),
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_anonymous_pages_cached_and_revalidated(self):
+        """Анониму страница отдаётся из кеша, по ETag приходит 304."""
+        for url, queries in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response["ETag"]
+                # Остаётся только поиск id группы, автора или поста для
+                # отметок изменений.
+                with self.assertNumQueries(queries):
+                    cached = self.client.get(url)
+                self.assertEqual(cached.content, response.content)
+                not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_changes_update_etag(self):
+        """Правка поста меняет ETag, авторизованным кеш не отдаётся."""
+        url = reverse("posts:index")
+        etag = self.client.get(url)["ETag"]
+        self.post.text = "Новый текст"
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Новый текст")
+        self.client.force_login(self.user)
+        self.assertFalse(self.client.get(url).has_header("ETag"))
+
+    def test_changes_touch_only_their_pages(self):
+        """Комментарий меняет страницы своего поста, но не чужие."""
+        other = User.objects.create_user(username="other")
+        other_post = Post.objects.create(text="Другой", author=other)
+        pages = {
+            "own": reverse("posts:post_detail", args=(self.post.pk,)),
+            "index": reverse("posts:index"),
+            "other": reverse("posts:post_detail", args=(other_post.pk,)),
+            "other_profile": reverse("posts:profile", args=(other.username,)),
+        }
+        etags = {name: self.client.get(url)["ETag"]
+                 for name, url in pages.items()}
+        Comment.objects.create(post=self.post, author=other, text="Отзыв")
+        changed = {
+            name for name, url in pages.items()
+            if self.client.get(url)["ETag"] != etags[name]
+        }
+        self.assertEqual(changed, {"own", "index"})
+
+    def test_invalidation_repeated_after_commit(self):
+        """Версии карточки и страниц меняются ещё раз после фиксации:
+        собранное до неё под новыми ключами не остаётся."""
+        url = reverse("posts:index")
+        with mock.patch.object(transaction, "on_commit") as on_commit:
+            self.post.text = "Новый текст"
+            self.post.save()
+        card_key = cards.card_key(self.post)
+        etag = self.client.get(url)["ETag"]
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        self.assertNotEqual(cards.card_key(self.post), card_key)
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="writer")
+        self.client.force_login(self.reader)
+        self.old_post = Post.objects.create(text="старый", author=self.author)
+
+    def feed(self):
+        response = self.client.get(reverse("posts:follow_index"))
+        return list(response.context["page_obj"])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка её очищает."""
+        self.client.get(
+            reverse("posts:profile_follow", args=(self.author.username,))
+        )
+        self.assertEqual(self.feed(), [self.old_post])
+        new_post = Post.objects.create(text="новый", author=self.author)
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.client.get(
+            reverse("posts:profile_unfollow", args=(self.author.username,))
+        )
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_prolific_author_read_on_the_fly(self):
+        """Посты плодовитых авторов читаются без раскладки по лентам."""
+        with mock.patch.object(timeline, "FANOUT_FOLLOWERS_LIMIT", 0):
+            Follow.objects.create(user=self.reader, author=self.author)
+            new_post = Post.objects.create(text="новый", author=self.author)
+            self.assertFalse(TimelineEntry.objects.exists())
+            self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    def test_author_back_under_limit_is_fanned_out(self):
+        """Когда подписчиков становится не больше доли порога, посты,
+        написанные в режиме чтения на лету, раскладываются по лентам;
+        отписка на самой границе режим не меняет."""
+        others = [
+            User.objects.create_user(username=f"other{n}") for n in range(2)
+        ]
+        with mock.patch.object(timeline, "FANOUT_FOLLOWERS_LIMIT", 2):
+            for user in [self.reader, *others]:
+                Follow.objects.create(user=user, author=self.author)
+            new_post = Post.objects.create(text="новый", author=self.author)
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=new_post).exists()
+            )
+            self.assertEqual(self.feed(), [new_post, self.old_post])
+            Follow.objects.filter(user=others[0]).delete()
+            self.assertTrue(timeline.is_prolific(self.author.pk))
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=new_post).exists()
+            )
+            Follow.objects.filter(user=others[1]).delete()
+            self.assertFalse(timeline.is_prolific(self.author.pk))
+            self.assertEqual(self.feed(), [new_post, self.old_post])
+            self.assertEqual(
+                TimelineEntry.objects.filter(user=self.reader).count(), 2
+            )
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_fan_out_resumed_by_worker(self):
+        """Раскладка после возврата под порог идёт задачей, а не в
+        запросе отписки; до неё посты автора читаются на лету."""
+        other = User.objects.create_user(username="other")
+        with mock.patch.multiple(
+            timeline, FANOUT_FOLLOWERS_LIMIT=1, FANOUT_RESUME_RATIO=1
+        ):
+            Follow.objects.create(user=self.reader, author=self.author)
+            Follow.objects.create(user=other, author=self.author)
+            new_post = Post.objects.create(text="новый", author=self.author)
+            jobs.run_pending()
+            Follow.objects.filter(user=other).delete()
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=new_post).exists()
+            )
+            self.assertTrue(timeline.is_prolific(self.author.pk))
+            self.assertEqual(self.feed(), [new_post, self.old_post])
+            self.assertEqual(
+                Job.objects.filter(name="posts.resume_fan_out").count(), 1
+            )
+            jobs.run_pending()
+        self.assertFalse(timeline.is_prolific(self.author.pk))
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=new_post
+            ).exists()
+        )
+
+
+class BackgroundJobsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="writer", email="writer@example.com"
+        )
+        self.reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_post_side_effects_run_by_worker(self):
+        """Раскладка и индекс нового поста выполняются воркером, счётчик
+        автора — сразу."""
+        self.client.force_login(self.author)
+        self.client.post(reverse("posts:post_create"), {"text": "Кошка"})
+        post = Post.objects.get()
+        self.assertEqual(counters.get_stats(self.author).posts_count, 1)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertFalse(SearchTerm.objects.exists())
+        self.assertTrue(Job.objects.exists())
+        call_command("run_jobs", "--once", stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(list(search.search_posts("кошки")), [post])
+
+    def test_comment_notifies_post_author(self):
+        """О чужом комментарии автор поста узнаёт по почте."""
+        post = Post.objects.create(text="Пост", author=self.author)
+        for user in (self.reader, self.author):
+            self.client.force_login(user)
+            self.client.post(
+                reverse("posts:add_comment", args=(post.pk,)),
+                {"text": "Комментарий"},
+            )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["writer@example.com"])
+        self.assertIn("reader", mail.outbox[0].subject)
+
+
+class CommentPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="commenter")
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(text="Обсуждаемый", author=self.user)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f"Комментарий {i}")
+            for i in range(45)
+        )
+        self.comments = list(
+            Comment.objects.order_by("created", "id").values_list(
+                "text", flat=True
+            )
+        )
+
+    def test_detail_shows_first_batch(self):
+        """На странице поста первая пачка, стоимость не зависит от числа
+        комментариев."""
+        url = reverse("posts:post_detail", args=(self.post.pk,))
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        page = response.context["comments"]
+        self.assertEqual([c.text for c in page], self.comments[:20])
+        self.assertContains(response, page.next_cursor)
+
+    def test_fragment_loads_next_batches(self):
+        """Фрагмент отдаёт следующие пачки по курсору до конца."""
+        url = reverse("posts:post_comments", args=(self.post.pk,))
+        seen = []
+        cursor = ""
+        while True:
+            response = self.client.get(url, {"cursor": cursor})
+            self.assertTemplateUsed(response, "posts/includes/comments.html")
+            page = response.context["comments"]
+            seen.extend(c.text for c in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.comments)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="searcher")
+        self.cat = Post.objects.create(
+            text="Красивая кошка спит на окне", author=self.user
+        )
+        self.cats = Post.objects.create(
+            text="Кошки, кошки и ещё раз кошки", author=self.user
+        )
+        self.dog = Post.objects.create(text="Собака гуляет", author=self.user)
+
+    def find(self, query, **params):
+        response = self.client.get(
+            reverse("posts:search"), {"q": query, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["page_obj"])
+
+    def test_stemming_and_ranking(self):
+        """Находятся другие формы слова, частое упоминание выше."""
+        self.assertEqual(self.find("кошками"), [self.cats, self.cat])
+        self.assertEqual(self.find("красивые кошки"), [self.cat])
+        self.assertEqual(self.find("слон"), [])
+        self.assertEqual(self.find(""), [])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке поста и комментариях."""
+        self.dog.text = "Собака и кошка дружат"
+        self.dog.save()
+        self.assertIn(self.dog, self.find("кошка"))
+        comment = Comment.objects.create(
+            post=self.cat, author=self.user, text="Какой пушистый котик"
+        )
+        self.assertEqual(self.find("пушистые"), [self.cat])
+        comment.text = "Какой рыжий котик"
+        comment.save()
+        self.assertEqual(self.find("пушистые"), [])
+        self.assertEqual(self.find("рыжий"), [self.cat])
+        comment.delete()
+        self.assertEqual(self.find("рыжий"), [])
+        self.assertEqual(self.find("пушистые"), [])
+        self.cat.delete()
+        self.assertFalse(SearchTerm.objects.filter(post_id=None).exists())
+        self.assertNotIn(self.cat, self.find("кошка"))
+
+    def test_results_paginated(self):
+        """Результаты разбиты на страницы, запрос сохраняется в ссылках."""
+        Post.objects.bulk_create(
+            Post(text="Кошка номер {}".format(i), author=self.user)
+            for i in range(12)
+        )
+        for post in Post.objects.all():
+            search.index_post(post.pk)
+        response = self.client.get(reverse("posts:search"), {"q": "кошка"})
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        self.assertContains(response, "?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0")
+        self.assertEqual(len(self.find("кошка", page=2)), 4)
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        self.posts = [
+            Post.objects.create(
+                text=f"Пост {number}", author=self.author, group=self.group
+            )
+            for number in range(api.POSTS_PER_PAGE + 1)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_feeds_paginate_by_cursor(self):
+        """Ленты API отдают JSON и листаются курсором."""
+        urls = {
+            "api_index": reverse("posts:api_index"),
+            "api_group_list": reverse("posts:api_group_list", args=("group",)),
+            "api_profile": reverse("posts:api_profile", args=("writer",)),
+            "api_follow_index": reverse("posts:api_follow_index"),
+        }
+        self.client.force_login(self.reader)
+        for name, url in urls.items():
+            with self.subTest(name=name):
+                first = self.client.get(url).json()
+                self.assertEqual(
+                    first["results"][0]["id"], self.posts[-1].pk
+                )
+                self.assertEqual(
+                    first["results"][0]["author"], "writer"
+                )
+                second = self.client.get(
+                    url, {"cursor": first["next"]}
+                ).json()
+                self.assertEqual(
+                    [post["id"] for post in second["results"]],
+                    [self.posts[0].pk],
+                )
+                self.assertIsNone(second["next"])
+
+    def test_fields_selection(self):
+        """?fields= ограничивает поля, неизвестное поле — 400."""
+        url = reverse("posts:api_index")
+        response = self.client.get(url, {"fields": "id,text"})
+        self.assertEqual(
+            set(response.json()["results"][0]), {"id", "text"}
+        )
+        self.assertEqual(
+            self.client.get(url, {"fields": "password"}).status_code, 400
+        )
+
+    def test_post_detail_with_comments(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text="Отзыв")
+        data = self.client.get(
+            reverse("posts:api_post_detail", args=(post.pk,))
+        ).json()
+        self.assertEqual(data["post"]["group"], "group")
+        self.assertEqual(
+            [c["text"] for c in data["comments"]["results"]], ["Отзыв"]
+        )
+
+    def test_anonymous_caching_and_auth(self):
+        """Публичные ответы отдают ETag и 304, лента подписок — 401."""
+        url = reverse("posts:api_index")
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"]
+            ).status_code,
+            304,
+        )
+        self.assertEqual(
+            self.client.get(reverse("posts:api_follow_index")).status_code,
+            401,
+        )
+
+
+class ExportViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="analyst")
+        self.post = Post.objects.create(text="Для выгрузки", author=self.user)
+
+    def test_export_only_for_staff(self):
+        """Выгрузка доступна только персоналу и отдаётся потоком."""
+        url = reverse("posts:export", args=("posts",))
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url, {"format": "csv"})
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn("Для выгрузки", body)
+        self.assertEqual(response["X-Export-Watermark"], str(self.post.pk))
+        self.assertEqual(
+            self.client.get(url, {"since": "вчера"}).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse("posts:export", args=("users",))
+            ).status_code,
+            404,
+        )
+
+
 class ViewTestClass(TestCase):
     def test_error_page(self):
         response = self.client.get('/nonexist-page/')
@@ -339,6 +1060,84 @@ class PostFormTests(TestCase):
         )
         self.assertEqual(post.image, "posts/small.gif")
 
+    def test_thumbnail_pregenerated_off_request(self):
+        """Лента берёт только готовую миниатюру и не создаёт её сама."""
+        post = Post.objects.create(
+            text="С картинкой", author=self.user, image=self.uploaded
+        )
+        self.assertIsNone(thumbnails.lookup(post.image))
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, post.image.url)
+        self.assertIsNone(thumbnails.lookup(post.image))
+
+        thumbnails.generate(post.pk, post.image)
+        thumbnail = thumbnails.lookup(post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, thumbnail.url)
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_missing_thumbnail_queued_as_job(self):
+        """Без eager-режима недостающая миниатюра ставится задачей в
+        очередь, а не в пул потоков веб-процесса."""
+        post = Post.objects.create(
+            text="С картинкой", author=self.user, image=self.uploaded
+        )
+        Job.objects.all().delete()
+        with mock.patch.object(thumbnails, "pregenerate") as pregenerate:
+            self.guest_client.get(reverse("posts:index"))
+            self.guest_client.get(reverse("posts:post_detail", args=[post.pk]))
+        pregenerate.assert_not_called()
+        self.assertEqual(
+            Job.objects.filter(name="posts.thumbnail").count(), 1
+        )
+
+    def test_thumbnails_prefetched_for_page(self):
+        """Миниатюры всей страницы находятся одним запросом к БД."""
+        posts = [
+            Post.objects.create(
+                text=f"Картинка {i}", author=self.user, image=self.uploaded
+            )
+            for i in range(3)
+        ]
+        thumbnails.generate(posts[0].pk, posts[0].image)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        self.assertEqual(
+            posts[0].prefetched_thumbnail.url,
+            thumbnails.lookup(posts[0].image).url,
+        )
+        self.assertIsNone(posts[1].prefetched_thumbnail)
+        # Отсутствие миниатюры тоже запомнено в кеше.
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+
+    def test_feed_picture_variants(self):
+        """Лента отдаёт <picture> с WebP и JPEG нескольких ширин; картинки
+        ниже первой грузятся лениво."""
+        posts = [
+            Post.objects.create(
+                text=f"Картинка {i}", author=self.user, image=self.uploaded
+            )
+            for i in range(2)
+        ]
+        for post in posts:
+            thumbnails.generate(post.pk, post.image)
+        response = self.guest_client.get(reverse("posts:index"))
+        content = response.content.decode()
+        self.assertEqual(content.count('<source type="image/webp"'), 2)
+        for post in posts:
+            post = Post.objects.get(pk=post.pk)
+            thumbnails.prefetch([post])
+            for (width, format), file in post.prefetched_thumbnails.items():
+                self.assertIsNotNone(file)
+                self.assertIn(f"{file.url} {width}w", content)
+                self.assertTrue(file.url.endswith(
+                    ".webp" if format == "WEBP" else ".jpg"
+                ))
+        self.assertEqual(content.count('loading="lazy"'), 1)
+
     def test_image_in_post_detail(self):
         """Картинка передается в шаблоне post_detail."""
         form_data = {
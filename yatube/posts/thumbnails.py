@@ -0,0 +1,241 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core import jobs
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import cards, page_cache
+
+FEED_GEOMETRY = "960x339"
+FEED_OPTIONS = {"crop": "center", "upscale": True}
+# Варианты миниатюры для <picture>: ширины для srcset с пропорциями
+# FEED_GEOMETRY и форматы по убыванию предпочтения. Последний формат —
+# для <img>, его понимают все браузеры.
+FEED_WIDTHS = (480, 960)
+FEED_FORMATS = ("WEBP", "JPEG")
+FEED_SIZES = "(max-width: 960px) 100vw, 960px"
+# Основная миниатюра: FEED_GEOMETRY в формате для <img>.
+MAIN_VARIANT = (FEED_WIDTHS[-1], FEED_FORMATS[-1])
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+# Потоков пула по умолчанию; переопределяется THUMBNAIL_WORKERS, 0 —
+# миниатюра создаётся сразу после коммита в том же потоке.
+WORKERS: int = 2
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, который вернул бы get_thumbnail, но без
+        обращения к хранилищу и Pillow."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+_lookup = LookupBackend()
+
+
+def variants():
+    """Пары (ширина, формат) всех вариантов миниатюры ленты."""
+    return [(width, format) for format in FEED_FORMATS
+            for width in FEED_WIDTHS]
+
+
+def _variant_args(width, format):
+    feed_width, feed_height = map(int, FEED_GEOMETRY.split("x"))
+    geometry = f"{width}x{round(width * feed_height / feed_width)}"
+    return geometry, {**FEED_OPTIONS, "format": format}
+
+
+def _variant_file(image, width, format):
+    geometry, options = _variant_args(width, format)
+    return _lookup.thumbnail_file(image, geometry, **options)
+
+
+def lookup(image):
+    """Готовая основная миниатюра ленты из KV-хранилища или None."""
+    if not image:
+        return None
+    return default.kvstore.get(_variant_file(image, *MAIN_VARIANT))
+
+
+def _get_raw_many(keys):
+    """Сырые значения KV-хранилища одним get_many и одним запросом в БД."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list("key", "value")
+        )
+        # Как и sorl, запоминаем в кеше отсутствие записи.
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return values
+
+
+def prefetch(posts):
+    """Находит готовые варианты миниатюр для всех постов страницы разом:
+    post.prefetched_thumbnails — {(ширина, формат): файл или None},
+    post.prefetched_thumbnail — основная миниатюра FEED_GEOMETRY."""
+    posts = [post for post in posts if post.image]
+    keys = {
+        (post.pk, variant): add_prefix(
+            _variant_file(post.image, *variant).key
+        )
+        for post in posts
+        for variant in variants()
+    }
+    values = _get_raw_many(list(set(keys.values())))
+    for post in posts:
+        found = {}
+        for variant in variants():
+            value = values.get(keys[post.pk, variant])
+            found[variant] = (
+                deserialize_image_file(value)
+                if value and value != EMPTY_VALUE else None
+            )
+        post.prefetched_thumbnails = found
+        post.prefetched_thumbnail = found[MAIN_VARIANT]
+
+
+def picture(post):
+    """Данные для <picture> поста: <source> с srcset из готовых вариантов
+    и <img> — последний формат FEED_FORMATS или, пока миниатюр нет,
+    исходная картинка. None, если картинки у поста нет."""
+    if not post.image:
+        return None
+    if not hasattr(post, "prefetched_thumbnails"):
+        prefetch([post])
+    ready = post.prefetched_thumbnails
+    if not all(ready.values()):
+        schedule(post)
+    by_format = {
+        format: [
+            (width, ready[width, format]) for width in FEED_WIDTHS
+            if ready[width, format]
+        ]
+        for format in FEED_FORMATS
+    }
+    fallback = by_format.pop(FEED_FORMATS[-1])
+    result = {
+        "sources": [
+            {
+                "type": MIME_TYPES[format],
+                "srcset": _srcset(files),
+            }
+            for format, files in by_format.items() if files
+        ],
+        "sizes": FEED_SIZES,
+    }
+    if fallback:
+        largest = fallback[-1][1]
+        result.update(
+            src=largest.url, srcset=_srcset(fallback),
+            width=largest.width, height=largest.height,
+        )
+    else:
+        result.update(
+            src=post.image.url, srcset="",
+            width=post.image_width, height=post.image_height,
+        )
+    return result
+
+
+def _srcset(files):
+    return ", ".join(f"{file.url} {width}w" for width, file in files)
+
+
+def generate(post_id, image):
+    """Создаёт все варианты миниатюры и сбрасывает закешированную
+    разметку поста."""
+    for variant in variants():
+        geometry, options = _variant_args(*variant)
+        get_thumbnail(image, geometry, **options)
+    cards.invalidate_post(post_id)
+    page_cache.touch(page_cache.scopes_of_id(post_id))
+
+
+def _generate(post_id, image):
+    try:
+        generate(post_id, image)
+    except Exception:
+        logger.exception("Не удалось создать миниатюру %s", image.name)
+
+
+def _run(post_id, image):
+    try:
+        _generate(post_id, image)
+    finally:
+        with _lock:
+            _pending.discard(image.name)
+        # У потока пула своё соединение с БД, не держим его открытым.
+        connection.close()
+
+
+def _submit(post_id, image):
+    global _executor
+    workers = getattr(settings, "THUMBNAIL_WORKERS", WORKERS)
+    if not workers:
+        _generate(post_id, image)
+        return
+    with _lock:
+        if image.name in _pending:
+            return
+        _pending.add(image.name)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="thumbnails"
+            )
+    _executor.submit(_run, post_id, image)
+
+
+def pregenerate(post):
+    """Ставит миниатюру поста в пул потоков после фиксации транзакции."""
+    if post.image:
+        image = post.image
+        transaction.on_commit(lambda: _submit(post.pk, image))
+
+
+def schedule(post):
+    """Миниатюра нового изображения поста: задачей core.jobs, если
+    работает воркер, иначе — в пуле потоков процесса."""
+    if not post.image:
+        return
+    if jobs.eager():
+        pregenerate(post)
+    else:
+        from . import tasks
+        tasks.thumbnail.delay(
+            key=post.image.name, post_id=post.pk, image=post.image.name
+        )
@@ -0,0 +1,261 @@
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import paginators
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+# Авторов с большим числом подписчиков не раскладываем по лентам при
+# публикации: их посты читаются напрямую при показе ленты. Режим автора
+# хранится в AuthorStats.read_on_the_fly и меняет его update_mode.
+FANOUT_FOLLOWERS_LIMIT: int = 1000
+# К раскладке автор возвращается, только когда подписчиков стало не
+# больше этой доли порога: подписка и отписка на самой границе не
+# повторяют раскладку всех его постов.
+FANOUT_RESUME_RATIO: float = 0.9
+
+# Порядок ленты подписок — по дате и посту из записи ленты: так его
+# отдаёт индекс timeline_user_feed без отдельной сортировки.
+FEED_ORDERING = ("-feed_date", "-feed_post")
+
+
+def is_prolific(author_id):
+    return AuthorStats.objects.filter(
+        user_id=author_id, read_on_the_fly=True
+    ).exists()
+
+
+def resume_limit():
+    return int(FANOUT_FOLLOWERS_LIMIT * FANOUT_RESUME_RATIO)
+
+
+def update_mode(author_id):
+    """Переключает автора на чтение на лету, когда подписчиков больше
+    FANOUT_FOLLOWERS_LIMIT, и ставит задачу вернуть его к раскладке,
+    когда их не больше resume_limit()."""
+    stats = AuthorStats.objects.filter(user_id=author_id)
+    if stats.filter(
+        read_on_the_fly=False,
+        followers_count__gt=FANOUT_FOLLOWERS_LIMIT,
+    ).update(read_on_the_fly=True):
+        return
+    if stats.filter(
+        read_on_the_fly=True,
+        followers_count__lte=resume_limit(),
+    ).exists():
+        from . import tasks
+        tasks.resume_fan_out.delay(key=str(author_id), author_id=author_id)
+
+
+def resume_fan_out(author_id):
+    """Возвращает автора к раскладке и раскладывает все его посты по
+    лентам подписчиков: пока он читался на лету, новые посты и новые
+    подписки лент не заполняли. До конца раскладки лента продолжает
+    читать его посты на лету."""
+    with transaction.atomic():
+        if AuthorStats.objects.filter(
+            user_id=author_id,
+            read_on_the_fly=True,
+            followers_count__lte=resume_limit(),
+        ).update(read_on_the_fly=False):
+            backfill_followers(author_id)
+
+
+def sync_modes():
+    """Приводит режимы всех авторов в соответствие с числом подписчиков,
+    например после пересчёта счётчиков."""
+    drifted = AuthorStats.objects.filter(
+        Q(read_on_the_fly=False, followers_count__gt=FANOUT_FOLLOWERS_LIMIT)
+        | Q(read_on_the_fly=True, followers_count__lte=resume_limit())
+    ).values_list("user_id", flat=True)
+    for author_id in list(drifted):
+        update_mode(author_id)
+
+
+def follower_scopes(author_id):
+    """Ленты подписок всех подписчиков автора (см. paginators)."""
+    return [
+        f"follow:{user_id}" for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list("user_id", flat=True)
+    ]
+
+
+def fan_out_many(posts):
+    """Раскладывает новые посты по лентам подписчиков их авторов: по
+    одному запросу подписчиков на всю пачку."""
+    by_author = {}
+    for post in posts:
+        if post.author_id is not None:
+            by_author.setdefault(post.author_id, []).append(post)
+    prolific = set(
+        AuthorStats.objects.filter(
+            user_id__in=by_author, read_on_the_fly=True
+        ).values_list("user_id", flat=True)
+    )
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+        author_id__in=set(by_author) - prolific
+    ).values_list("user_id", "author_id"):
+        followers.setdefault(author_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for author_id, user_ids in followers.items()
+            for post in by_author[author_id]
+            for user_id in user_ids
+        ),
+        ignore_conflicts=True,
+    )
+    for author_id, user_ids in followers.items():
+        paginators.change_count(
+            [f"follow:{user_id}" for user_id in user_ids],
+            len(by_author[author_id]),
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if is_prolific(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        "id", "pub_date"
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def backfill_followers(author_id):
+    """Раскладывает все посты автора по лентам всех его подписчиков."""
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list("id", "pub_date")
+    )
+    followers = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in followers:
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, post_id=post_id, pub_date=pub_date
+                )
+                for post_id, pub_date in posts
+            ),
+            ignore_conflicts=True,
+        )
+    paginators.forget_count([f"follow:{user_id}" for user_id in followers])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+class MergedFeed:
+    """Лента из нескольких непересекающихся запросов, каждый из которых
+    идёт по своему индексу в порядке ленты. Срез берётся у каждого
+    запроса отдельно и сливается в Python: так обходится без сортировки
+    объединения во временном B-дереве. Поддерживает то, чем ленту
+    пользуются представления и пагинаторы."""
+
+    ordered = True
+
+    def __init__(self, parts, counted, ordering=FEED_ORDERING):
+        self.parts = parts
+        self.counted = counted
+        self.ordering = tuple(ordering)
+
+    def _clone(self, method, *args, **kwargs):
+        return MergedFeed(
+            [getattr(part, method)(*args, **kwargs) for part in self.parts],
+            self.counted,
+            self.ordering,
+        )
+
+    @property
+    def model(self):
+        return self.parts[0].model
+
+    @property
+    def query(self):
+        return self.parts[0].query
+
+    def for_feed(self):
+        return self._clone("for_feed")
+
+    def values(self, *fields):
+        return self._clone("values", *fields)
+
+    def filter(self, *args, **kwargs):
+        return self._clone("filter", *args, **kwargs)
+
+    def order_by(self, *ordering):
+        feed = self._clone("order_by", *ordering)
+        feed.ordering = tuple(ordering)
+        return feed
+
+    def reverse(self):
+        feed = self._clone("reverse")
+        feed.ordering = tuple(
+            name[1:] if name.startswith("-") else f"-{name}"
+            for name in self.ordering
+        )
+        return feed
+
+    def count(self):
+        return self.counted.count()
+
+    def _value(self, row, name):
+        if isinstance(row, dict):
+            return row[name]
+        return getattr(row, name)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.stop is None:
+            raise TypeError("Ленту можно только срезать с границей")
+        rows = [row for part in self.parts for row in part[:item.stop]]
+        for name in reversed(self.ordering):
+            field = name.lstrip("-")
+            rows.sort(
+                key=lambda row: self._value(row, field),
+                reverse=name.startswith("-"),
+            )
+        return rows[item]
+
+
+def timeline_posts(user):
+    """Посты ленты подписок: материализованная часть плюс чтение на лету
+    для плодовитых авторов, которых не раскладывали при публикации.
+    Каждый плодовитый автор читается своим запросом по индексу
+    (author, pub_date), записи ленты — по timeline_user_feed."""
+    prolific = list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__read_on_the_fly=True,
+        ).values_list("author_id", flat=True)
+    )
+    materialized = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F("timeline_entries__pub_date"),
+        feed_post=F("timeline_entries__post_id"),
+    )
+    if not prolific:
+        return materialized
+    # Записи, оставшиеся от времени раскладки, читаются на лету.
+    parts = [materialized.exclude(author_id__in=prolific)] + [
+        Post.objects.filter(author_id=author_id).annotate(
+            feed_date=F("pub_date"), feed_post=F("id")
+        )
+        for author_id in prolific
+    ]
+    counted = Post.objects.filter(
+        Q(author_id__in=prolific)
+        | Q(pk__in=TimelineEntry.objects.filter(user=user).values("post_id"))
+    )
+    return MergedFeed(parts, counted)
@@ -1,42 +1,84 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
 
+from . import export
+from .counters import get_stats
 from .forms import CommentForm, PostForm
-from .models import Comment, Group, Post, User, Follow
+from .models import Group, Post, User, Follow
+from .page_cache import (group_scope, index_scope, post_scope,
+                         profile_scope, public_page)
+from .paginators import CountingPaginator, KeysetPaginator
+from .search import search_posts
+from .thumbnails import schedule
+from .timeline import FEED_ORDERING, timeline_posts
 
 POSTS_PER_PAGE: int = 10
-
-
-def get_page_obj(request, posts):
-    paginator = Paginator(posts, POSTS_PER_PAGE)
+COMMENTS_PER_PAGE: int = 20
+
+
+def get_page_obj(request, posts, keyset=False, ordering=("-pub_date", "-id"),
+                 scope=None, count=None):
+    """Страница ленты.
+
+    Ленты с ``keyset=True`` листаются курсором ``?cursor=`` в порядке
+    ordering; явный ``?page=`` оставляет старую нумерованную разбивку
+    для закладок. Число записей для неё берётся из count или из кеша
+    ленты scope (см. CountingPaginator).
+    """
+    if keyset and "page" not in request.GET:
+        paginator = KeysetPaginator(posts, POSTS_PER_PAGE, ordering=ordering)
+        return paginator.get_page(request.GET.get("cursor"))
+    paginator = CountingPaginator(
+        posts, POSTS_PER_PAGE, scope=scope, known_count=count
+    )
     page_number = request.GET.get("page")
     return paginator.get_page(page_number)
 
 
-# @cache_page (20)
+def get_comments_page(request, post):
+    """Пачка комментариев поста, от старых к новым, по курсору."""
+    comments = post.comments.select_related("author")
+    paginator = KeysetPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=("created", "id")
+    )
+    return paginator.get_page(request.GET.get("cursor"))
+
+
+@public_page(index_scope)
 def index(request):
-    posts = Post.objects.select_related("group").all()
+    posts = Post.objects.for_feed()
     template = "posts/index.html"
-    page_obj = get_page_obj(request, posts)
+    page_obj = get_page_obj(request, posts, keyset=True, scope="index")
     context = {"page_obj": page_obj}
     return render(request, template, context)
 
 
+@public_page(group_scope)
 def group_posts(request, slug):
     template = "posts/group_list.html"
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = get_page_obj(request, posts)
+    posts = group.posts.for_feed()
+    page_obj = get_page_obj(
+        request, posts, keyset=True, scope=f"group:{group.pk}"
+    )
     context = {"group": group, "page_obj": page_obj}
     return render(request, template, context)
 
 
+@public_page(profile_scope)
 def profile(request, username):
     template = "posts/profile.html"
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = get_page_obj(request, posts)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    stats = get_stats(author)
+    posts = author.posts.for_feed()
+    page_obj = get_page_obj(
+        request, posts, keyset=True, count=stats.posts_count
+    )
     following = (
         Follow.objects.filter(author=author)
         .filter(user=request.user.id)
@@ -50,11 +92,16 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@public_page(post_scope)
 def post_detail(request, post_id):
     form = CommentForm(request.POST or None)
     template = "posts/post_detail.html"
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), pk=post_id
+    )
+    if post.author is not None:
+        get_stats(post.author)
+    comments = get_comments_page(request, post)
     context = {
         "form": form,
         "post": post,
@@ -63,13 +110,25 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@public_page(post_scope)
+def post_comments(request, post_id):
+    """Фрагмент со следующей пачкой комментариев для подгрузки."""
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    context = {
+        "post": post,
+        "comments": get_comments_page(request, post),
+    }
+    return render(request, "posts/includes/comments.html", context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == "POST":
         if form.is_valid():
             form.instance.author = request.user
-            form.save()
+            post = form.save()
+            schedule(post)
             return redirect("posts:profile", username=request.user)
     return render(request, "posts/create_post.html", {"form": form})
 
@@ -84,7 +143,9 @@ def post_edit(request, post_id):
         request.POST or None, files=request.FILES or None, instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if "image" in form.changed_data:
+            schedule(post)
         return redirect("posts:post_detail", post_id=post_id)
     context = {
         "post": post,
@@ -106,15 +167,26 @@ def add_comment(request, post_id):
     return redirect("posts:post_detail", post_id=post_id)
 
 
+def search(request):
+    query = request.GET.get("q", "").strip()
+    posts = search_posts(query)
+    page_obj = get_page_obj(request, posts)
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+        "page_query": urlencode({"q": query}) + "&",
+    }
+    return render(request, "posts/search.html", context)
+
+
 @login_required
 def follow_index(request):
-    follower = (
-        Follow.objects.filter(user=request.user).values_list("author_id")
+    posts = timeline_posts(request.user).for_feed().order_by(*FEED_ORDERING)
+    page_obj = get_page_obj(
+        request, posts, keyset=True, ordering=FEED_ORDERING,
+        scope=f"follow:{request.user.pk}",
     )
-    posts = Post.objects.filter(author_id__in=follower)
-    page_obj = get_page_obj(request, posts)
     context = {
-        "follower": follower,
         "page_obj": page_obj,
     }
     return render(request, "posts/follow.html", context)
@@ -133,3 +205,42 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     get_object_or_404(Follow, user=request.user, author=author).delete()
     return redirect("posts:follow_index")
+
+
+@staff_member_required
+def export_table(request, table):
+    """Потоковая выгрузка таблицы для аналитики, только для персонала.
+
+    Параметры: format (jsonl, csv), gzip=1, since (ISO-дата), after_id.
+    Заголовок X-Export-Watermark — after_id для следующей выгрузки.
+    """
+    if table not in export.TABLES:
+        raise Http404
+    fmt = request.GET.get("format", "jsonl")
+    if fmt not in export.FORMATS:
+        return HttpResponseBadRequest("Неизвестный формат.")
+    since = after_id = None
+    try:
+        if request.GET.get("since"):
+            since = export.parse_since(request.GET["since"])
+        if request.GET.get("after_id"):
+            after_id = int(request.GET["after_id"])
+    except ValueError:
+        return HttpResponseBadRequest("Неверные since или after_id.")
+    gzip = request.GET.get("gzip") == "1"
+    upto_id = export.watermark(table)
+    response = StreamingHttpResponse(
+        export.export(
+            table, fmt=fmt, gzip=gzip, since=since, after_id=after_id,
+            upto_id=upto_id,
+        ),
+        content_type=(
+            "application/gzip" if gzip
+            else "text/csv; charset=utf-8" if fmt == "csv"
+            else "application/x-ndjson; charset=utf-8"
+        ),
+    )
+    filename = f"{table}.{fmt}" + (".gz" if gzip else "")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["X-Export-Watermark"] = str(upto_id)
+    return response
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +83,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Потоков для WSGI-приложения под ASGI-сервером (yatube/asgi.py).
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -89,9 +94,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами потока, прагмы из core.db
+        # выставляются один раз при его открытии.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
     }
 }
 
+# Реплики для чтения: файлы через запятую в DB_REPLICAS. Локально их
+# обновляет команда sync_replicas, в тестах они — зеркала основной базы.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной базы.
+REPLICA_STICKY_SECONDS = 10
+
+# Переопределения прагм SQLite поверх core.db.PRAGMAS.
+SQLITE_PRAGMAS = {}
+
+# Фоновые задачи (core/jobs.py). 1 — задачи выполняются сразу в запросе
+# (разработка, тесты), 0 — ставятся в очередь в базе, выполняет их
+# команда run_jobs.
+JOBS_ALWAYS_EAGER = os.environ.get('JOBS_ALWAYS_EAGER', '1') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -142,8 +176,37 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся во временный файл по мере приёма, а не в память:
+# картинку PostForm читает с диска (см. posts/images.py).
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Общий для всех воркеров кеш в файле SQLite и короткий кеш в памяти
+# процесса перед ним (см. core/cache.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
+
+# Свой кеш и миниатюры без пула в тестах (см. core/testing.py)
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Выборочное профилирование запросов (см. core/profiling.py): доля
+# профилируемых запросов, 0 — выключено. Отчёт: manage.py profile_report
+PROFILING_SAMPLE_RATE = 0
+PROFILING_LOG = os.path.join(BASE_DIR, 'logs', 'profile.log')
+PROFILING_LOG_MAX_BYTES = 10 * 1024 * 1024
+PROFILING_LOG_BACKUPS = 5